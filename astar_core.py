@@ -1,20 +1,59 @@
-from heapq import heappush, heappop
+from array import array
+from heapq import heappush, heappop, heapify
 import time
 import math
 # core
 
-def astar(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None):
+# "dict" = original tuple/dict bookkeeping, "array" = flat buffers + int cells
+ENGINE = "array"
+
+# (heuristic_fn, goal_xy, cols, rows) -> table, oldest dropped first
+_h_tables = {}
+H_TABLE_CACHE_SIZE = 32
+
+
+def cell_index(x, y, rows):
+    """Cell number used by astar_array and heuristic tables (column-major)."""
+    return x * rows + y
+
+
+def heuristic_table(heuristic_fn, goal_xy, cols, rows):
+    """
+    heuristic_fn(p, goal_xy) for every cell, as array('d') indexed by cell_index().
+    Memoized per (heuristic_fn, goal, size), so each cell is evaluated once per
+    goal across queries. Only for heuristics that depend on (p, goal) alone.
+    """
+    key = (heuristic_fn, goal_xy, cols, rows)
+    table = _h_tables.get(key)
+    if table is None:
+        table = array("d", (heuristic_fn((x, y), goal_xy) for x in range(cols) for y in range(rows)))
+        if len(_h_tables) >= H_TABLE_CACHE_SIZE:
+            _h_tables.pop(next(iter(_h_tables)))
+        _h_tables[key] = table
+    return table
+
+
+def astar(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None, engine=None, h_table=None, stats=None):
     """
     grid: 2D list of 0 (free) / 1 (blocked)
     start_xy, goal_xy: (x, y)
     heuristic_fn: function (p, goal_xy) -> estimate cost
     deadline_ms: max time in milliseconds (None = no deadline)
+    engine: "dict" or "array" (None = module ENGINE)
+    h_table: optional precomputed heuristic per cell (see heuristic_table());
+             without it each cell's heuristic is still evaluated only once per query
+    stats: optional dict, gets stats["expanded"] = number of nodes popped
 
     returns: (path_xy, hit_deadline)
         path_xy = list[(x, y)] from start to goal,
                    or best-so-far path if deadline hit
         hit_deadline = True if time limit exceeded
     """
+    if (engine or ENGINE) == "array":
+        return astar_array(
+            grid, start_xy, goal_xy, heuristic_fn, deadline_ms=deadline_ms, h_table=h_table, stats=stats
+        )
+
     rows, cols = len(grid), len(grid[0])
 
     def in_bounds(p):
@@ -32,8 +71,17 @@ def astar(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None):
             if in_bounds(nxt) and passable(nxt):
                 yield nxt
 
+    h_cache = {}
+
     def h(p):
-        return heuristic_fn(p, goal_xy)
+        v = h_cache.get(p)
+        if v is None:
+            if h_table is not None:
+                v = h_table[p[0] * rows + p[1]]
+            else:
+                v = heuristic_fn(p, goal_xy)
+            h_cache[p] = v
+        return v
 
     start_t = time.perf_counter()
 
@@ -44,22 +92,26 @@ def astar(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None):
     g_score = {start_xy: 0.0}
 
     best_node = start_xy
+    best_h = h(start_xy)
+    expanded = 0
 
     while open_heap:
         if deadline_ms is not None:
             elapsed_ms = (time.perf_counter() - start_t) * 1000.0
             if elapsed_ms > deadline_ms:
                 path = reconstruct_path(came_from, best_node)
-                return path, True
+                return _finish(stats, expanded, (path, True))
 
         f, g, current = heappop(open_heap)
+        expanded += 1
 
-        if h(current) < h(best_node):
-            best_node = current
+        cur_h = h(current)
+        if cur_h < best_h:
+            best_node, best_h = current, cur_h
 
         if current == goal_xy:
             path = reconstruct_path(came_from, current)
-            return path, False
+            return _finish(stats, expanded, (path, False))
 
         for nxt in neighbors(current):
             tentative_g = g_score[current] + 1.0  # each step cost 1
@@ -70,7 +122,142 @@ def astar(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None):
                 heappush(open_heap, (f_score, tentative_g, nxt))
 
     # No path exists
-    return None, False
+    return _finish(stats, expanded, (None, False))
+
+
+def _finish(stats, expanded, result):
+    if stats is not None:
+        stats["expanded"] = expanded
+    return result
+
+
+def arastar(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None, w_start=2.5, w_step=0.5, h_table=None):
+    """
+    Anytime Repairing A* (ARA*).
+
+    First runs weighted A* (f = g + w * h) to completion, so a complete path
+    comes back whenever one exists, deadline or not. Then keeps lowering w
+    toward 1, reusing g-values and the INCONS list between passes, until the
+    path is proven optimal or deadline_ms runs out.
+
+    h_table: optional precomputed heuristic per cell, as in astar()
+
+    returns: (path_xy, hit_deadline, bound)
+        path_xy = best complete path found (None if no path exists)
+        bound   = suboptimality bound: cost(path) <= bound * optimal cost
+    """
+    rows, cols = len(grid), len(grid[0])
+
+    def neighbors(p):
+        x, y = p
+        for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:  # 4-dir
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < cols and 0 <= ny < rows and grid[ny][nx] == 0:
+                yield (nx, ny)
+
+    h_cache = {}
+
+    def h(p):
+        v = h_cache.get(p)
+        if v is None:
+            if h_table is not None:
+                v = h_table[p[0] * rows + p[1]]
+            else:
+                v = heuristic_fn(p, goal_xy)
+            h_cache[p] = v
+        return v
+
+    start_t = time.perf_counter()
+
+    def out_of_time():
+        if deadline_ms is None:
+            return False
+        return (time.perf_counter() - start_t) * 1000.0 > deadline_ms
+
+    came_from = {start_xy: None}
+    g_score = {start_xy: 0.0}
+    w = max(1.0, float(w_start))
+
+    open_set = {start_xy}
+    closed = set()
+    incons = set()
+    open_heap = []
+
+    def fval(p):
+        return g_score[p] + w * h(p)
+
+    def rebuild_heap():
+        open_heap.clear()
+        for p in open_set:
+            open_heap.append((fval(p), g_score[p], p))
+        heapify(open_heap)
+
+    def improve_path(check_deadline):
+        """One weighted pass; returns False if the deadline cut it short."""
+        while open_heap:
+            f, g, p = open_heap[0]
+            if p not in open_set or g != g_score[p]:
+                heappop(open_heap)  # stale entry
+                continue
+            if g_score.get(goal_xy, math.inf) + w * h(goal_xy) <= f:
+                return True
+            if check_deadline and out_of_time():
+                return False
+
+            heappop(open_heap)
+            open_set.discard(p)
+            closed.add(p)
+
+            tentative_g = g_score[p] + 1.0  # each step cost 1
+            for nxt in neighbors(p):
+                if tentative_g < g_score.get(nxt, math.inf):
+                    came_from[nxt] = p
+                    g_score[nxt] = tentative_g
+                    if nxt in closed:
+                        incons.add(nxt)
+                    else:
+                        open_set.add(nxt)
+                        heappush(open_heap, (fval(nxt), tentative_g, nxt))
+        return True
+
+    def current_bound():
+        lo = min((g_score[p] + h(p) for p in open_set | incons), default=math.inf)
+        if lo <= 0 or lo == math.inf:
+            return 1.0
+        return max(1.0, min(w, g_score[goal_xy] / lo))
+
+    rebuild_heap()
+    improve_path(check_deadline=False)
+
+    if goal_xy not in g_score:
+        # No path exists
+        return None, out_of_time(), math.inf
+
+    best_path = reconstruct_path(came_from, goal_xy)
+    bound = current_bound()
+    hit_deadline = False
+
+    while bound > 1.0:
+        if out_of_time():
+            hit_deadline = True
+            break
+
+        w = max(1.0, w - w_step)
+        open_set |= incons
+        incons.clear()
+        closed.clear()
+        rebuild_heap()
+
+        finished = improve_path(check_deadline=True)
+        if len(best_path) - 1 > g_score[goal_xy]:
+            # parent pointers always form a valid path, even mid-pass
+            best_path = reconstruct_path(came_from, goal_xy)
+        if not finished:
+            hit_deadline = True
+            break
+        bound = current_bound()
+
+    return best_path, hit_deadline, bound
 
 
 def reconstruct_path(came_from, node):
@@ -81,4 +268,288 @@ def reconstruct_path(came_from, node):
         path.append(node)
         node = came_from[node]
     path.reverse()
-    return path
\ No newline at end of file
+    return path
+
+
+def astar_array(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None, h_table=None, stats=None):
+    """
+    Same contract as astar(), but the search runs on flat buffers:
+      - occupancy copied once into a bytes buffer
+      - cells are ints, numbered column-major (x * rows + y) so heap ties
+        break exactly like the (x, y) tuples in the dict engine
+      - g / parent are preallocated arrays instead of dicts
+      - heuristic values come from h_table, or are filled in lazily (once per cell)
+      - heap entries are single ints packing (f, g, cell) while f stays integral
+        (Manhattan and other integer heuristics); a fractional value (learned
+        heuristics, h_table floats) switches the heap back to (f, g, cell) tuples
+    """
+    rows, cols = len(grid), len(grid[0])
+    n = rows * cols
+
+    cells = getattr(grid, "cells", None)
+    if cells is not None:
+        # world.OccupancyGrid: row-major 0/1 bytes already, just transpose by column slices
+        occ = b"".join(cells[x::cols] for x in range(cols))
+    else:
+        occ = bytes(1 if grid[y][x] else 0 for x in range(cols) for y in range(rows))
+
+    start = start_xy[0] * rows + start_xy[1]
+    goal = goal_xy[0] * rows + goal_xy[1]
+
+    g_score = array("l", [n]) * n  # steps; n = not reached (a path has at most n - 1)
+    parent = array("l", [-1]) * n
+
+    if h_table is not None:
+        h_vals = h_table
+    else:
+        h_vals = array("d", [math.nan]) * n  # NaN = not evaluated yet
+
+    def h(i):
+        v = h_vals[i]
+        if v != v:
+            v = h_vals[i] = heuristic_fn(divmod(i, rows), goal_xy)
+        return v
+
+    def path_to(i):
+        path = []
+        while i != -1:
+            path.append(divmod(i, rows))
+            i = parent[i]
+        path.reverse()
+        return path
+
+    # packed key: f << f_shift | g << cell_bits | cell, same order as (f, g, cell)
+    cell_bits = n.bit_length()
+    f_shift = cell_bits + n.bit_length()
+    cell_mask = (1 << cell_bits) - 1
+    packed = h_table is None  # tables are float arrays: int() per push would eat the gain
+
+    start_t = time.perf_counter()
+
+    g_score[start] = 0
+    best_node = start
+    best_h = h(start)
+
+    open_heap = [(best_h, 0, start)]
+    if packed and best_h % 1 == 0:
+        open_heap = [int(best_h) << f_shift | start]
+    else:
+        packed = False
+
+    last_col = n - rows
+    expanded = 0
+
+    while open_heap:
+        if deadline_ms is not None:
+            elapsed_ms = (time.perf_counter() - start_t) * 1000.0
+            if elapsed_ms > deadline_ms:
+                return _finish(stats, expanded, (path_to(best_node), True))
+
+        current = heappop(open_heap)
+        current = current & cell_mask if packed else current[2]
+        expanded += 1
+
+        cur_h = h(current)
+        if cur_h < best_h:
+            best_node, best_h = current, cur_h
+
+        if current == goal:
+            return _finish(stats, expanded, (path_to(current), False))
+
+        y = current % rows
+        tentative_g = g_score[current] + 1  # each step cost 1
+
+        # same order as the dict engine: +x, -x, +y, -y
+        for nxt in (
+            current + rows if current < last_col else -1,
+            current - rows if current >= rows else -1,
+            current + 1 if y < rows - 1 else -1,
+            current - 1 if y > 0 else -1,
+        ):
+            if nxt < 0 or occ[nxt]:
+                continue
+            if tentative_g < g_score[nxt]:
+                parent[nxt] = current
+                g_score[nxt] = tentative_g
+                f = tentative_g + h(nxt)
+                if packed:
+                    if f % 1 == 0:  # False for fractions and inf
+                        heappush(open_heap, int(f) << f_shift | tentative_g << cell_bits | nxt)
+                        continue
+                    # first fractional f: unpack what's queued (all integral) and go on with tuples
+                    open_heap = [(k >> f_shift, (k >> cell_bits) & cell_mask, k & cell_mask) for k in open_heap]
+                    heapify(open_heap)
+                    packed = False
+                heappush(open_heap, (f, tentative_g, nxt))
+
+    # No path exists
+    return _finish(stats, expanded, (None, False))
+
+
+def jump_point_search(grid, start_xy, goal_xy, heuristic_fn, deadline_ms=None):
+    """
+    Jump Point Search for 4-dir, uniform-cost grids.
+    Same arguments and (path_xy, hit_deadline) contract as astar(); the returned
+    path is already expanded back to unit steps.
+
+    Straight runs are scanned without touching the heap; only cells with a
+    forced neighbor (or the goal) become jump points. Cells are ints into a
+    flat occupancy buffer padded with a blocked border, so scans need no
+    bounds checks.
+    """
+    rows, cols = len(grid), len(grid[0])
+    W = cols + 2
+
+    occ = bytearray(b"\x01") * (W * (rows + 2))
+    cells = getattr(grid, "cells", None)
+    for y in range(rows):
+        base = (y + 1) * W + 1
+        if cells is not None:
+            occ[base:base + cols] = cells[y * cols:(y + 1) * cols]
+            continue
+        row = grid[y]
+        for x in range(cols):
+            if row[x] == 0:
+                occ[base + x] = 0
+
+    def cell(p):
+        return (p[1] + 1) * W + p[0] + 1
+
+    def xy(i):
+        y, x = divmod(i, W)
+        return (x - 1, y - 1)
+
+    start = cell(start_xy)
+    goal = cell(goal_xy)
+
+    # every cell on a scan shares the scan's result, so memoize them per query
+    # (a lazily built JPS+ jump table); horizontal scans repeat a lot from vertical runs
+    h_jumps = {1: {}, -1: {}}
+    v_jumps = {W: {}, -W: {}}
+
+    def jump_h(i, d):
+        cache = h_jumps[d]
+        visited = []
+        result = -1
+        while not occ[i]:
+            if i in cache:
+                result = cache[i]
+                break
+            visited.append(i)
+            if i == goal:
+                result = i
+                break
+            # forced neighbor: side cell open here but closed one step back
+            if (not occ[i - W] and occ[i - W - d]) or (not occ[i + W] and occ[i + W - d]):
+                result = i
+                break
+            i += d
+        for v in visited:
+            cache[v] = result
+        return result
+
+    def jump_v(i, d):
+        cache = v_jumps[d]
+        visited = []
+        result = -1
+        while not occ[i]:
+            if i in cache:
+                result = cache[i]
+                break
+            visited.append(i)
+            if i == goal:
+                result = i
+                break
+            if (not occ[i - 1] and occ[i - 1 - d]) or (not occ[i + 1] and occ[i + 1 - d]):
+                result = i
+                break
+            # vertical runs have to stop wherever a horizontal run would find something
+            if jump_h(i + 1, 1) >= 0 or jump_h(i - 1, -1) >= 0:
+                result = i
+                break
+            i += d
+        for v in visited:
+            cache[v] = result
+        return result
+
+    def successors(i, parent):
+        if parent is None:
+            dirs = (1, -1, W, -W)
+        else:
+            step = i - parent
+            if -W < step < W:  # came in horizontally
+                d = 1 if step > 0 else -1
+                dirs = (d, W, -W)
+            else:
+                d = W if step > 0 else -W
+                dirs = (d, 1, -1)
+        for d in dirs:
+            jp = jump_h(i + d, d) if d in (1, -1) else jump_v(i + d, d)
+            if jp >= 0:
+                yield jp
+
+    def h(i):
+        return heuristic_fn(xy(i), goal_xy)
+
+    def path_to(i):
+        points = []
+        while i is not None:
+            points.append(xy(i))
+            i = came_from[i]
+        points.reverse()
+        return expand_jump_path(points)
+
+    start_t = time.perf_counter()
+
+    open_heap = []
+    heappush(open_heap, (h(start), 0, start))
+
+    came_from = {start: None}
+    g_score = {start: 0.0}
+
+    best_node = start
+    best_h = h(start)
+
+    while open_heap:
+        if deadline_ms is not None:
+            elapsed_ms = (time.perf_counter() - start_t) * 1000.0
+            if elapsed_ms > deadline_ms:
+                return path_to(best_node), True
+
+        f, g, current = heappop(open_heap)
+        if g > g_score[current]:
+            continue  # stale entry
+
+        cur_h = h(current)
+        if cur_h < best_h:
+            best_node, best_h = current, cur_h
+
+        if current == goal:
+            return path_to(current), False
+
+        for nxt in successors(current, came_from[current]):
+            # jump points are on a straight line, so the step cost is the run length
+            dy, dx = divmod(abs(nxt - current), W)
+            tentative_g = g_score[current] + (dy if dx == 0 else dx)
+            if tentative_g < g_score.get(nxt, math.inf):
+                came_from[nxt] = current
+                g_score[nxt] = tentative_g
+                heappush(open_heap, (tentative_g + h(nxt), tentative_g, nxt))
+
+    # No path exists
+    return None, False
+
+
+def expand_jump_path(points):
+    """[(0, 0), (3, 0), (3, 2)] -> every unit step between consecutive jump points."""
+    if not points:
+        return []
+    path = [points[0]]
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        dx = (x2 > x1) - (x2 < x1)
+        dy = (y2 > y1) - (y2 < y1)
+        x, y = x1, y1
+        while (x, y) != (x2, y2):
+            x, y = x + dx, y + dy
+            path.append((x, y))
+    return path
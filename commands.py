@@ -1,5 +1,5 @@
 from world import label_to_xy
-from crazyflie_control import fly_moves, fly_segments, fly_replanning, fly_fixed_path_with_checks
+from crazyflie_control import fly_moves, fly_segments, fly_trajectory, fly_replanning, fly_fixed_path_with_checks
 # cmds
 
 def path_labels_to_deltas(path_labels):
@@ -65,10 +65,12 @@ def compress_moves(moves):
     return out
 
 
-def execute_path_on_cf(path_labels, compress=False, on_state=None):
+def execute_path_on_cf(path_labels, compress=False, on_state=None, session=None, trajectory=False):
     """
     Full pipeline:
       path_labels -> deltas -> move names -> (optional compress) -> Crazyflie flight
+    session: crazyflie_control.CrazyflieSession to reuse (None = one-off connection)
+    trajectory: fly the segments as one uploaded polynomial trajectory instead of go_to's
     """
     if not path_labels or len(path_labels) < 2:
         print("Path too short or empty, nothing to do.")
@@ -77,22 +79,28 @@ def execute_path_on_cf(path_labels, compress=False, on_state=None):
     deltas = path_labels_to_deltas(path_labels)
     moves = deltas_to_move_names(deltas)
 
+    if trajectory:
+        segments = compress_moves(moves)
+        print(f"Raw moves: {len(moves)} | Trajectory pieces: {len(segments)}")
+        fly_trajectory(segments, on_state=on_state, session=session)
+        return
+
     if compress:
         segments = compress_moves(moves)
         print(f"Raw moves: {len(moves)} | Segments: {len(segments)}")
         print("Segments:", segments)
-        fly_segments(segments, on_state=on_state)
+        fly_segments(segments, on_state=on_state, session=session)
         return
 
     print("Moves to fly:", moves)
-    fly_moves(moves, on_state=on_state)
+    fly_moves(moves, on_state=on_state, session=session)
 
 
-def execute_replanning_on_cf(step_provider, on_state=None):
-    """Run replanning flight with step_provider callback."""
-    fly_replanning(step_provider, on_state=on_state)
+def execute_replanning_on_cf(step_provider, on_state=None, session=None, prepare_next=None):
+    """Run replanning flight with step_provider callback (prepare_next runs during each move)."""
+    fly_replanning(step_provider, on_state=on_state, session=session, prepare_next=prepare_next)
 
 
-def execute_v1_with_dynamic_checks(path_labels, on_state=None):
+def execute_v1_with_dynamic_checks(path_labels, on_state=None, session=None):
     """Run v1 fixed path flight with dynamic obstacle checks (lands if blocked)."""
-    fly_fixed_path_with_checks(path_labels, stop_if_blocked=True, on_state=on_state)
\ No newline at end of file
+    fly_fixed_path_with_checks(path_labels, stop_if_blocked=True, on_state=on_state, session=session)
\ No newline at end of file
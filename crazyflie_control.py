@@ -1,12 +1,82 @@
+import os
+import threading
 import time
-import cflib.crtp
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.high_level_commander import HighLevelCommander
-from cflib.crazyflie.log import LogConfig
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import cflib.crtp
+    from cflib.crazyflie import Crazyflie
+    from cflib.crazyflie.high_level_commander import HighLevelCommander
+    from cflib.crazyflie.log import LogConfig
+    init_drivers = cflib.crtp.init_drivers
+    HAVE_CFLIB = True
+except Exception:  # no cflib: only the simulator (CF_SIM) can fly
+    Crazyflie = HighLevelCommander = LogConfig = init_drivers = None
+    HAVE_CFLIB = False
+
+try:
+    from cflib.crazyflie.mem import MemoryElement, Poly, Poly4D
+    HAVE_TRAJ = True
+except Exception:  # older cflib without trajectory memory support
+    HAVE_TRAJ = False
 # ctrl
 URI = 'radio://0/80/2M'
 
 CELL = 0.10
+ARRIVE_TOL = 0.03  # m, per axis: close enough to call a go_to done
+
+# Onboard trajectory limits
+TRAJ_VMAX = 0.30    # m/s
+TRAJ_AMAX = 0.50    # m/s^2
+TRAJ_ID = 1
+# trajectory memory is 4 KB; one Poly4D piece = duration + 4 axes x 8 float32 coeffs
+TRAJ_MAX_PIECES = 4096 // ((1 + 4 * 8) * 4)  # 31
+
+# Estimator convergence after a reset (replaces the old fixed 2 s sleep)
+EST_VAR_MAX = 1e-3   # m^2 per axis (~3 cm std)
+EST_SPREAD = 1e-3    # or: variance changing less than this over the window
+EST_WINDOW = 10      # samples at 100 Hz
+EST_TIMEOUT = 5.0    # s
+LINK_TIMEOUT = 10.0  # s for open_link to finish (TOC / param download)
+
+
+class RealClock:
+    """Wall-clock time; sim_crazyflie.VirtualClock has the same interface."""
+
+    @staticmethod
+    def sleep(dt):
+        time.sleep(dt)
+
+    @staticmethod
+    def monotonic():
+        return time.monotonic()
+
+    @staticmethod
+    def wait(cond, timeout):
+        cond.wait(timeout)
+
+
+clock = RealClock()
+
+
+def use_backend(backend):
+    """
+    Swap what this module flies with. backend provides Crazyflie, HighLevelCommander,
+    LogConfig, MemoryElement, Poly, Poly4D, init_drivers and clock
+    (see sim_crazyflie.SimBackend). Affects sessions created afterwards.
+    """
+    global Crazyflie, HighLevelCommander, LogConfig, MemoryElement, Poly, Poly4D
+    global init_drivers, clock, HAVE_TRAJ
+    Crazyflie = backend.Crazyflie
+    HighLevelCommander = backend.HighLevelCommander
+    LogConfig = backend.LogConfig
+    MemoryElement, Poly, Poly4D = backend.MemoryElement, backend.Poly, backend.Poly4D
+    init_drivers = backend.init_drivers
+    clock = backend.clock
+    HAVE_TRAJ = True
+    CrazyflieSession._drivers_ready = False
 
 
 def apply_move_to_xy(cur_x, cur_y, move, count=1):
@@ -22,11 +92,11 @@ def apply_move_to_xy(cur_x, cur_y, move, count=1):
     return cur_x, cur_y
 
 
-def start_state_logger(cf, on_state):
+def start_state_logger(cf, on_state, period_ms=100):
     """
-    Calls on_state(x, y, z) at ~10 Hz.
+    Calls on_state(x, y, z) every period_ms (default ~10 Hz).
     """
-    lg = LogConfig(name="state", period_in_ms=100)  # 10 Hz
+    lg = LogConfig(name="state", period_in_ms=period_ms)
     lg.add_variable("stateEstimate.x", "float")
     lg.add_variable("stateEstimate.y", "float")
     lg.add_variable("stateEstimate.z", "float")
@@ -44,68 +114,447 @@ def start_state_logger(cf, on_state):
     return lg
 
 
-def reset_estimator(cf: Crazyflie):
-    """Reset Kalman estimator so it doesn't start with a weird offset."""
-    print("Resetting estimator...")
-    cf.param.set_value('kalman.resetEstimation', '1')
-    time.sleep(0.1)
-    cf.param.set_value('kalman.resetEstimation', '0')
-    time.sleep(2.0)  # let it chill
-
+def segments_to_pieces(segments, z, vmax=TRAJ_VMAX, amax=TRAJ_AMAX):
+    """
+    segments: [("right", 3), ("down", 2), ...] (same mapping as fly_segments)
+    returns: [(duration, cx, cy, cz, cyaw), ...], one polynomial piece per segment,
+             coefficients low -> high order, 8 each (Crazyflie Poly format)
+
+    Each piece is a straight line with a minimum-jerk (quintic) rest-to-rest
+    profile, s(tau) = 10 tau^3 - 15 tau^4 + 6 tau^5, so the drone never leaves
+    the grid path at corners. The duration is the shortest one that keeps peak
+    speed (1.875 L/T) under vmax and peak acceleration (5.774 L/T^2) under amax.
+    """
+    pieces = []
+    cur_x, cur_y = 0.0, 0.0
+    for move, count in segments:
+        nxt_x, nxt_y = apply_move_to_xy(cur_x, cur_y, move, count)
+        dx, dy = nxt_x - cur_x, nxt_y - cur_y
+        length = abs(dx) + abs(dy)
+        if length == 0.0:
+            continue
 
-def setup_cf(on_state=None):
-    """Connect, set estimator, reset, return (cf, hl, target_z, logger)."""
-    cflib.crtp.init_drivers()
+        T = max(1.875 * length / vmax, (5.7735 * length / amax) ** 0.5)
 
-    cf = Crazyflie(rw_cache='./cache')
-    cf.open_link(URI)
+        def axis(p0, d):
+            return [p0, 0.0, 0.0, 10.0 * d / T ** 3, -15.0 * d / T ** 4, 6.0 * d / T ** 5, 0.0, 0.0]
 
-    time.sleep(1.0)
+        pieces.append((T, axis(cur_x, dx), axis(cur_y, dy), [z] + [0.0] * 7, [0.0] * 8))
+        cur_x, cur_y = nxt_x, nxt_y
+    return pieces
 
-    cf.param.set_value('stabilizer.estimator', '2')
-    time.sleep(0.1)
 
-    reset_estimator(cf)
+def wait_for_estimator(cf, var_max=EST_VAR_MAX, spread=EST_SPREAD, window=EST_WINDOW, timeout=EST_TIMEOUT):
+    """
+    Stream kalman.varP{X,Y,Z} at 100 Hz until the estimate has settled: every
+    axis below var_max, or (flow deck only, where position variance never
+    shrinks) each axis varying less than spread over the last `window` samples.
+    returns: seconds it took, or None if it timed out
+    """
+    lg = LogConfig(name="converge", period_in_ms=10)
+    for axis in "XYZ":
+        lg.add_variable(f"kalman.varP{axis}", "float")
+    history = deque(maxlen=window)
 
-    hl = HighLevelCommander(cf)
-    target_z = 0.25  # meters
+    def _cb(timestamp, data, logconf):
+        history.append((data["kalman.varPX"], data["kalman.varPY"], data["kalman.varPZ"]))
 
-    print("Takeoff")
-    hl.takeoff(target_z, 1.5)
-    time.sleep(2.0)
+    cf.log.add_config(lg)
+    lg.data_received_cb.add_callback(_cb)
+    t0 = clock.monotonic()
+    lg.start()
+    try:
+        while clock.monotonic() - t0 < timeout:
+            clock.sleep(0.01)
+            if not history:
+                continue
+            if all(v < var_max for v in history[-1]):
+                return clock.monotonic() - t0
+            if len(history) == window and all(
+                max(h[a] for h in history) - min(h[a] for h in history) < spread for a in range(3)
+            ):
+                return clock.monotonic() - t0
+        return None
+    finally:
+        lg.delete()  # stop and free the block (the firmware only has a few)
 
-    print("Stabilizing at origin")
-    for _ in range(10):
-        hl.go_to(0.0, 0.0, target_z, 0.0, 0.20)
-        time.sleep(0.25)
 
-    logger = None
-    if on_state is not None:
-        logger = start_state_logger(cf, on_state)
+def reset_estimator(cf, timeout=EST_TIMEOUT):
+    """
+    Reset Kalman estimator so it doesn't start with a weird offset, then wait
+    until it has converged. returns: convergence time (s), None if it timed out.
+    """
+    print("Resetting estimator...")
+    cf.param.set_value('kalman.resetEstimation', '1')
+    clock.sleep(0.1)
+    cf.param.set_value('kalman.resetEstimation', '0')
+    took = wait_for_estimator(cf, timeout=timeout)
+    if took is None:
+        print(f"[ESTIMATOR] not converged after {timeout:.1f}s, flying anyway")
+    else:
+        print(f"[ESTIMATOR] converged in {took:.2f}s")
+    return took
 
-    return cf, hl, target_z, logger
 
+class CrazyflieSession:
+    """
+    Long-lived link to one Crazyflie, reused across missions.
+
+    connect() runs once: drivers, link (TOC/param cache in ./cache), estimator
+    choice and one state log block. Each mission then only pays for what it
+    needs: begin_mission() resets the estimator and takes off if the drone is on
+    the ground, end_mission() lands it, or with hover_between=True flies back to
+    the origin and stays up, so the next mission starts right away.
+
+    start_label: board cell the next mission starts from (None = not tied to the
+    board). While hovering the estimator origin stays at the cell it took off
+    from; returns to it go around the world's obstacles, and a mission with a
+    different start_label first flies there and lands to re-anchor.
+
+    Moves go through go_to(), which returns as soon as the state estimate is
+    within arrive_tol of the target (duration + 0.3 s at most, the old fixed sleep).
+
+    State comes in every telemetry_period_ms (arrival checks see every sample);
+    mission on_state callbacks get at most state_hz updates. With telemetry_dir,
+    a TelemetryRecorder (needs numpy) also records each connection to
+    telemetry_dir/flight_*.bin; the default is not to record.
+
+    with CrazyflieSession() as s:
+        fly_moves(moves, session=s)
+        fly_segments(segments, session=s)
+    """
 
-def teardown_cf(cf: Crazyflie, hl: HighLevelCommander, target_z: float, logger=None):
-    """Land and close link."""
-    if logger is not None:
+    _drivers_ready = False
+    _drivers_lock = threading.Lock()  # swarms connect several sessions at once
+
+    def __init__(self, uri=URI, target_z=0.25, hover_between=False, arrive_tol=ARRIVE_TOL,
+                 telemetry_dir=None, telemetry_period_ms=10, state_hz=10.0):
+        self.uri = uri
+        self.target_z = target_z
+        self.hover_between = hover_between
+        self.arrive_tol = arrive_tol
+        self.telemetry_dir = telemetry_dir
+        self.telemetry_period_ms = telemetry_period_ms
+        self.state_hz = state_hz
+
+        self.cf = None
+        self.hl = None
+        self.airborne = False
+        self.on_state = None  # current mission's callback, fed (decimated) by the state stream
+
+        # last estimate from the logger, and the last commanded (x, y) of this mission
+        self.position = None
+        self._pos_cond = threading.Condition()
+        self.cur_x, self.cur_y = 0.0, 0.0
+        self.land_requested = False  # set during a mission to land in place at the end
+        self.start_label = None
+        self._anchor = None  # start_label the estimator origin sits on (while airborne)
+
+        self.telemetry = None
+        self._logger = None  # plain state log block when not recording
+        self._next_state = 0.0
+        self.startup = {}  # latest link_s / estimator_s (startup latency metrics)
+        self._lock = threading.Lock()  # one mission at a time
+
+    @property
+    def connected(self):
+        return self.cf is not None
+
+    def connect(self):
+        if self.cf is not None:
+            return
+        if Crazyflie is None:
+            raise RuntimeError("cflib is not installed (set CF_SIM=1 to fly the simulator)")
+        with CrazyflieSession._drivers_lock:
+            if not CrazyflieSession._drivers_ready:
+                init_drivers()
+                CrazyflieSession._drivers_ready = True
+
+        t0 = clock.monotonic()
+        cf = Crazyflie(rw_cache='./cache')
+        linked = threading.Event()
+        failed = []
+        cf.fully_connected.add_callback(lambda uri: linked.set())
+        cf.connection_failed.add_callback(lambda uri, msg: (failed.append(msg), linked.set()))
+        cf.open_link(self.uri)
+
+        # fully_connected fires once the TOCs and parameters are in (fast with ./cache)
+        while not linked.is_set():
+            if clock.monotonic() - t0 > LINK_TIMEOUT:
+                cf.close_link()
+                raise RuntimeError(f"{self.uri}: link not up after {LINK_TIMEOUT:.0f}s")
+            clock.sleep(0.01)
+        if failed:
+            raise RuntimeError(f"{self.uri}: connection failed: {failed[0]}")
+        self.startup["link_s"] = clock.monotonic() - t0
+
+        cf.param.set_value('stabilizer.estimator', '2')
+        clock.sleep(0.1)
+
+        self.cf = cf
+        self.hl = HighLevelCommander(cf)
+        if self.telemetry_dir:
+            from telemetry import TelemetryRecorder, new_path  # numpy only when recording
+
+            self.telemetry = TelemetryRecorder(
+                cf, LogConfig,
+                path=new_path(self.telemetry_dir),
+                period_ms=self.telemetry_period_ms,
+                on_position=self._update_position,
+            )
+            self.telemetry.add_watcher(self._dispatch_state, hz=self.state_hz)
+            self.telemetry.meta["link_s"] = round(self.startup["link_s"], 3)
+            self.telemetry.start()
+        else:
+            self._logger = start_state_logger(cf, self._on_sample, period_ms=self.telemetry_period_ms)
+        print(f"[SESSION] connected to {self.uri} in {self.startup['link_s']:.2f}s")
+
+    def _update_position(self, x, y, z):
+        with self._pos_cond:
+            self.position = (x, y, z)
+            self._pos_cond.notify_all()
+
+    def _on_sample(self, x, y, z):
+        self._update_position(x, y, z)
+        now = clock.monotonic()
+        if now >= self._next_state:
+            self._next_state = now + 1.0 / self.state_hz
+            self._dispatch_state(x, y, z)
+
+    def _dispatch_state(self, x, y, z):
+        cb = self.on_state
+        if cb is not None:
+            cb(x, y, z)
+
+    def wait_until_arrived(self, target, tol=None, timeout=3.0):
+        """
+        Block until the state estimate is within tol (m, per axis) of target (x, y, z).
+        returns: True on arrival, False on timeout
+        """
+        tol = self.arrive_tol if tol is None else tol
+        tx, ty, tz = target
+        deadline = clock.monotonic() + timeout
+        with self._pos_cond:
+            while True:
+                p = self.position
+                if p is not None and abs(p[0] - tx) <= tol and abs(p[1] - ty) <= tol and abs(p[2] - tz) <= tol:
+                    return True
+                remaining = deadline - clock.monotonic()
+                if remaining <= 0:
+                    return False
+                clock.wait(self._pos_cond, remaining)
+
+    def start_go_to(self, x, y, duration):
+        """Send a go_to to (x, y) at target_z without waiting; returns the (x, y, z) target."""
+        self.hl.go_to(x, y, self.target_z, 0.0, duration)
+        self.cur_x, self.cur_y = x, y
+        return (x, y, self.target_z)
+
+    def go_to(self, x, y, duration):
+        """Fly to (x, y) at target_z and wait for arrival; returns False if it timed out."""
+        self.start_go_to(x, y, duration)
+        t0 = clock.monotonic()
+        arrived = self.wait_until_arrived((x, y, self.target_z), timeout=duration + 0.3)
+        if not arrived:
+            print(f"[SESSION] not within {self.arrive_tol:.2f} m of ({x:.3f}, {y:.3f}) "
+                  f"after {duration + 0.3:.1f}s, moving on")
+        else:
+            print(f"[SESSION] arrived in {clock.monotonic() - t0:.2f}s (budget {duration + 0.3:.1f}s)")
+        return arrived
+
+    def upload_trajectory(self, pieces, traj_id=TRAJ_ID):
+        """Write polynomial pieces to the trajectory memory and define them as traj_id."""
+        if not HAVE_TRAJ:
+            raise RuntimeError("cflib has no trajectory memory support")
+        if len(pieces) > TRAJ_MAX_PIECES:
+            raise ValueError(f"{len(pieces)} pieces, trajectory memory holds {TRAJ_MAX_PIECES}")
+
+        mems = self.cf.mem.get_mems(MemoryElement.TYPE_TRAJ)
+        if not mems:
+            raise RuntimeError("No trajectory memory on this Crazyflie")
+        mem = mems[0]
+        mem.trajectory = [
+            Poly4D(T, Poly(cx), Poly(cy), Poly(cz), Poly(cyaw)) for (T, cx, cy, cz, cyaw) in pieces
+        ]
+
+        if hasattr(mem, "write_data_sync"):
+            ok = mem.write_data_sync()
+        else:
+            done = threading.Event()
+            mem.write_data(lambda *_: done.set())
+            ok = done.wait(5.0)
+        if not ok:
+            raise RuntimeError("Trajectory upload failed")
+
+        self.hl.define_trajectory(traj_id, 0, len(pieces))
+
+    def run_trajectory(self, pieces, traj_id=TRAJ_ID):
+        """
+        Upload and fly pieces (absolute coordinates, from the current commanded position).
+        Longer than the memory allows -> flown in chunks, each starting where the last ended.
+        """
+        for i in range(0, len(pieces), TRAJ_MAX_PIECES):
+            chunk = pieces[i:i + TRAJ_MAX_PIECES]
+            self.upload_trajectory(chunk, traj_id)
+
+            total = sum(p[0] for p in chunk)
+            T, cx, cy = chunk[-1][:3]
+            end_x = sum(c * T ** k for k, c in enumerate(cx))
+            end_y = sum(c * T ** k for k, c in enumerate(cy))
+            print(f"[TRAJ] {len(chunk)} pieces, {total:.1f}s -> ({end_x:.3f}, {end_y:.3f})")
+
+            self.hl.start_trajectory(traj_id, 1.0, False)
+            self.cur_x, self.cur_y = end_x, end_y
+            clock.sleep(max(0.0, total - 0.5))
+            self.wait_until_arrived((end_x, end_y, self.target_z), timeout=1.0)
+
+    def _fly_over_grid(self, goal_label):
+        """
+        Fly from the commanded cell to goal_label one cell per go_to, around the
+        world's obstacles. returns: False if there is no way (nothing flown)
+        """
+        import world
+        from distance_field import DistanceField
+
+        ax, ay = world.label_to_xy(self._anchor)
+        # estimator frame -> board, as in fly_moves (origin = anchor cell)
+        cx, cy = ax - round(self.cur_y / CELL), ay - round(self.cur_x / CELL)
+        field = DistanceField(world.label_to_xy(goal_label))
         try:
-            logger.stop()
-        except Exception:
-            pass
-
-    print("Landing")
-    hl.land(0.0, 1.5)
-    time.sleep(2.0)
-
-    cf.close_link()
-    print("Link closed")
+            inside = 0 <= cx < field.cols and 0 <= cy < field.rows
+            path = field.plan_from((cx, cy)) if inside else None
+        finally:
+            field.close()
+        if path is None:
+            return False
+        for x, y in path[1:]:
+            self.go_to((ay - y) * CELL, (ax - x) * CELL, 2.0)
+        return True
+
+    def begin_mission(self, on_state=None):
+        """Get the drone hovering at the origin (start_label) for a new mission."""
+        self._lock.acquire()
+        try:
+            self.connect()
+            if self.airborne and self.start_label is not None and self.start_label != self._anchor:
+                # still anchored at the last start: fly over, land and take off with a fresh origin
+                print(f"Start moved to {self.start_label}: flying there to re-anchor")
+                moved = self._anchor is not None and self._fly_over_grid(self.start_label)
+                self._land()
+                if not moved:
+                    raise RuntimeError(f"no way to the new start {self.start_label}, landed in place")
+            if not self.airborne:
+                took = reset_estimator(self.cf)
+                self.startup["estimator_s"] = took
+                if self.telemetry is not None:
+                    self.telemetry.meta.setdefault("estimator_s", []).append(
+                        None if took is None else round(took, 3))
+
+                print("Takeoff")
+                self.hl.takeoff(self.target_z, 1.5)
+                clock.sleep(2.0)
+
+                print("Stabilizing at origin")
+                for _ in range(10):
+                    self.hl.go_to(0.0, 0.0, self.target_z, 0.0, 0.20)
+                    clock.sleep(0.25)
+                self.airborne = True
+                self._anchor = self.start_label
+        except BaseException:
+            self._lock.release()
+            raise
+
+        self.cur_x, self.cur_y = 0.0, 0.0
+        self.land_requested = False
+        self.on_state = on_state
+
+    def end_mission(self):
+        """
+        Land, or (hover_between) fly back to the origin and keep hovering: around
+        the world's obstacles when the origin cell is known, else straight.
+        land_requested always lands in place, and so does a return with no way back.
+        """
+        self.on_state = None
+        try:
+            if not self.airborne:
+                return
+            if self.hover_between and not self.land_requested:
+                print("Back to origin (hovering between missions)")
+                if self._anchor is None:
+                    cells = (abs(self.cur_x) + abs(self.cur_y)) / CELL
+                    self.go_to(0.0, 0.0, max(1.0, 2.0 * cells))  # same speed as fly_moves
+                elif not self._fly_over_grid(self._anchor):
+                    print(f"No way back to {self._anchor} -> landing in place")
+                    self._land()
+            else:
+                self._land()
+        finally:
+            self._lock.release()
+
+    def _land(self):
+        print("Landing")
+        self.hl.land(0.0, 1.5)
+        clock.sleep(2.0)
+        self.airborne = False
+        self._anchor = None
+
+    def close(self):
+        """Land if still up, stop logging and close the link."""
+        if self.cf is None:
+            return
+        with self._lock:
+            if self.airborne:
+                self._land()
+            if self.telemetry is not None:
+                try:
+                    self.telemetry.stop()
+                except Exception as e:
+                    print("[SESSION] telemetry stop failed:", e)
+                self.telemetry = None
+            if self._logger is not None:
+                try:
+                    self._logger.stop()
+                except Exception:
+                    pass
+                self._logger = None
+            self.cf.close_link()
+            self.cf = None
+            self.hl = None
+        print("Link closed")
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def mission(session=None, on_state=None):
+    """
+    Yields the session for one flight (begin_mission ... end_mission).
+    Without a session it connects and closes a one-off link (old behavior).
+    """
+    own = session is None
+    if own:
+        session = CrazyflieSession()
+    try:
+        session.begin_mission(on_state)
+        try:
+            yield session
+        finally:
+            session.end_mission()
+    finally:
+        if own:
+            session.close()
 
 
-def fly_moves(moves, on_state=None):
+def fly_moves(moves, on_state=None, session=None):
     """
     moves: list like ["right", "right", "down", "left", ...]
     Each move = one CELL in world coordinates.
+    session: CrazyflieSession to fly on (None = connect/land/disconnect just for this)
 
     Board-to-crazyflie coordinate mapping:
       Board "down" (rows 1->2->3) = crazyflie X+ (forward)
@@ -113,13 +562,13 @@ def fly_moves(moves, on_state=None):
       Board "right" (cols A->B->C) = crazyflie Y- (right)
       Board "left"  (cols C->B->A) = crazyflie Y+ (left)
     """
-    cf, hl, target_z, logger = setup_cf(on_state=on_state)
+    with mission(session, on_state) as s:
+        target_z = s.target_z
 
-    # local idea of where the drone is in (x, y) for crazyflie frame
-    cur_x = 0.0
-    cur_y = 0.0
+        # local idea of where the drone is in (x, y) for crazyflie frame
+        cur_x = 0.0
+        cur_y = 0.0
 
-    try:
         for m in moves:
             if m == "right":
                 cur_y -= CELL  # crazyflie Y- = board right
@@ -134,25 +583,19 @@ def fly_moves(moves, on_state=None):
                 continue
 
             print(f"Move {m} -> go_to({cur_x:.3f}, {cur_y:.3f}, {target_z:.3f})")
-            # go_to(x, y, z, yaw, duration)
-            hl.go_to(cur_x, cur_y, target_z, 0.0, 2.0)
-            time.sleep(2.3)  # a bit longer than duration for safety
-
-    finally:
-        teardown_cf(cf, hl, target_z, logger=logger)
+            s.go_to(cur_x, cur_y, 2.0)  # waits for arrival (2.3 s at most)
 
 
-def fly_segments(segments, on_state=None):
+def fly_segments(segments, on_state=None, session=None):
     """
     segments: [("right", 3), ("down", 2), ...]
     Does one go_to per segment using the SAME mapping as fly_moves().
     """
-    cf, hl, target_z, logger = setup_cf(on_state=on_state)
-
-    cur_x = 0.0
-    cur_y = 0.0
+    with mission(session, on_state) as s:
+        target_z = s.target_z
+        cur_x = 0.0
+        cur_y = 0.0
 
-    try:
         for move, count in segments:
             if move == "right":
                 cur_y -= CELL * count
@@ -170,56 +613,58 @@ def fly_segments(segments, on_state=None):
             print(
                 f"Segment {move} x{count} -> go_to({cur_x:.3f}, {cur_y:.3f}, {target_z:.3f})"
             )
-            hl.go_to(cur_x, cur_y, target_z, 0.0, duration)
-            time.sleep(duration + 0.3)
-
-    finally:
-        teardown_cf(cf, hl, target_z, logger=logger)
+            s.go_to(cur_x, cur_y, duration)
 
 
-def fly_replanning(step_provider, on_state=None):
+def fly_replanning(step_provider, on_state=None, session=None, prepare_next=None):
     """
     Replanning flight: calls step_provider() for each move.
     step_provider returns a move string ("right", "left", etc.) or None to stop.
+
+    prepare_next(move): optional, run on a worker thread while `move` is in the air,
+    so planning for the following step overlaps the transit. It is always finished
+    before the next step_provider() call, which decides whether to use its result.
     """
-    cf, hl, target_z, logger = setup_cf(on_state=on_state)
-    cur_x, cur_y = 0.0, 0.0
+    with mission(session, on_state) as s, ThreadPoolExecutor(max_workers=1) as pool:
+        cur_x, cur_y = 0.0, 0.0
 
-    # Give logger time to send first state estimate
-    time.sleep(0.5)
+        # Give logger time to send first state estimate
+        clock.sleep(0.5)
 
-    try:
         while True:
             m = step_provider()
             if m is None:
                 break
 
             cur_x, cur_y = apply_move_to_xy(cur_x, cur_y, m, count=1)
-            print(f"[REPLAN] Move {m} -> go_to({cur_x:.3f}, {cur_y:.3f}, {target_z:.3f})")
-            hl.go_to(cur_x, cur_y, target_z, 0.0, 2.0)
-            time.sleep(2.3)
+            print(f"[REPLAN] Move {m} -> go_to({cur_x:.3f}, {cur_y:.3f}, {s.target_z:.3f})")
 
-    finally:
-        teardown_cf(cf, hl, target_z, logger=logger)
+            pending = pool.submit(prepare_next, m) if prepare_next is not None else None
+            s.go_to(cur_x, cur_y, 2.0)
+            if pending is not None:
+                try:
+                    pending.result()
+                except Exception as e:
+                    print("[REPLAN] prepare_next failed:", e)
 
 
-def fly_fixed_path_with_checks(path_labels, stop_if_blocked=True, on_state=None):
+def fly_fixed_path_with_checks(path_labels, stop_if_blocked=True, on_state=None, session=None):
     """
     Follows a fixed planned path, but BEFORE each step checks if the NEXT cell is now blocked.
     If blocked: land in place.
     """
     import world
 
-    cf, hl, target_z, logger = setup_cf(on_state=on_state)
-    cur_x, cur_y = 0.0, 0.0
+    with mission(session, on_state) as s:
+        cur_x, cur_y = 0.0, 0.0
 
-    try:
         for i in range(len(path_labels) - 1):
             nxt_lbl = path_labels[i + 1]
 
             x, y = world.label_to_xy(nxt_lbl)
             if stop_if_blocked and world.grid[y][x] == 1:
                 print(f"[V1] Next cell {nxt_lbl} blocked -> landing now")
+                s.land_requested = True
                 break
 
             x1, y1 = world.label_to_xy(path_labels[i])
@@ -236,11 +681,32 @@ def fly_fixed_path_with_checks(path_labels, stop_if_blocked=True, on_state=None)
                 m = "up"
             else:
                 print(f"[V1] Non-4dir step {path_labels[i]}->{nxt_lbl} -> landing")
+                s.land_requested = True
                 break
 
             cur_x, cur_y = apply_move_to_xy(cur_x, cur_y, m, count=1)
-            hl.go_to(cur_x, cur_y, target_z, 0.0, 2.0)
-            time.sleep(2.3)
+            s.go_to(cur_x, cur_y, 2.0)
 
-    finally:
-        teardown_cf(cf, hl, target_z, logger=logger)
+
+def fly_trajectory(segments, on_state=None, session=None, vmax=TRAJ_VMAX, amax=TRAJ_AMAX):
+    """
+    segments: [("right", 3), ("down", 2), ...]
+    Same path as fly_segments(), but flown as one onboard polynomial trajectory
+    (uploaded once, started with one command) instead of a go_to per segment.
+    Falls back to fly_segments() if the cflib install has no trajectory support.
+    """
+    if not HAVE_TRAJ:
+        print("[TRAJ] cflib has no trajectory memory support, flying segments instead")
+        fly_segments(segments, on_state=on_state, session=session)
+        return
+
+    with mission(session, on_state) as s:
+        s.run_trajectory(segments_to_pieces(segments, s.target_z, vmax=vmax, amax=amax))
+
+
+if os.environ.get("CF_SIM"):
+    # CF_SIM=1 -> simulator at real-time speed, CF_SIM=50 -> 50x, CF_SIM=max -> as fast as possible
+    import sim_crazyflie
+    _speed = os.environ["CF_SIM"]
+    use_backend(sim_crazyflie.SimBackend(speed=None if _speed == "max" else float(_speed)))
+    print(f"[SIM] Crazyflie simulator backend (speed={_speed})")
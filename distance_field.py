@@ -0,0 +1,191 @@
+import math
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+
+import world
+# cost-to-go
+
+
+def goal_distances(grid, goal_xy):
+    """
+    Reverse BFS from goal over free cells (4-dir, each step cost 1).
+    returns: array('d') of cost-to-go, indexed y * cols + x (inf = unreachable/blocked)
+    """
+    rows, cols = len(grid), len(grid[0])
+    dist = array("d", [math.inf]) * (rows * cols)
+
+    gx, gy = goal_xy
+    if grid[gy][gx] == 1:
+        return dist
+
+    dist[gy * cols + gx] = 0.0
+    queue = deque([(gx, gy)])
+    while queue:
+        x, y = queue.popleft()
+        d = dist[y * cols + x] + 1.0
+        for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:  # 4-dir
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < cols and 0 <= ny < rows and grid[ny][nx] == 0:
+                i = ny * cols + nx
+                if d < dist[i]:
+                    dist[i] = d
+                    queue.append((nx, ny))
+    return dist
+
+
+class DistanceField:
+    """
+    Goal-rooted cost-to-go table over world snapshots.
+
+    Built once per goal, then patched in place when the world change feed reports
+    flipped cells, so a path from any start is just a greedy descent.
+    """
+
+    def __init__(self, goal_xy):
+        self.goal = goal_xy
+
+        self._changes = world.ChangeQueue()
+        self.grid = world.snapshot()
+        self._rebuild()
+
+    def close(self):
+        """Stop listening for world changes."""
+        self._changes.close()
+
+    def _rebuild(self):
+        self.rows, self.cols = len(self.grid), len(self.grid[0])
+        # occupancy as last seen by the field (to skip set+clear pairs)
+        self.occ = bytearray(
+            1 if self.grid[y][x] else 0 for y in range(self.rows) for x in range(self.cols)
+        )
+        self.dist = goal_distances(self.grid, self.goal)
+
+    def _sync(self):
+        """Apply queued cell flips to the table."""
+        changed, reset = self._changes.drain()
+
+        # snapshot taken after draining, so it already holds every drained flip
+        self.grid = world.snapshot()
+
+        if reset or (len(self.grid), len(self.grid[0])) != (self.rows, self.cols):
+            self._rebuild()
+            return
+
+        for (x, y) in changed:
+            i = y * self.cols + x
+            val = 1 if self.grid[y][x] else 0
+            if val == self.occ[i]:
+                continue
+            self.occ[i] = val
+            if (x, y) == self.goal:
+                self.dist = goal_distances(self.grid, self.goal)
+            elif val:
+                self._raise(i)
+            else:
+                self._lower(i)
+
+    def _neighbors(self, i):
+        cols = self.cols
+        x = i % cols
+        if x < cols - 1:
+            yield i + 1
+        if x > 0:
+            yield i - 1
+        if i + cols < len(self.occ):
+            yield i + cols
+        if i >= cols:
+            yield i - cols
+
+    def _lower(self, i):
+        """Cell i became free: pull its distance down and spread the improvement."""
+        dist, occ = self.dist, self.occ
+        d = min((dist[n] for n in self._neighbors(i) if not occ[n]), default=math.inf) + 1.0
+        if d == math.inf:
+            return
+        dist[i] = d
+        queue = deque([i])
+        while queue:
+            u = queue.popleft()
+            d = dist[u] + 1.0
+            for n in self._neighbors(u):
+                if not occ[n] and d < dist[n]:
+                    dist[n] = d
+                    queue.append(n)
+
+    def _raise(self, i):
+        """Cell i became blocked: invalidate cells that relied on it, then refill them."""
+        dist, occ = self.dist, self.occ
+        if dist[i] == math.inf:
+            return
+
+        # Collect cells whose every shortest route went through i (BFS by old distance)
+        raised = {i}
+        queue = deque([i])
+        while queue:
+            u = queue.popleft()
+            d = dist[u] + 1.0
+            for n in self._neighbors(u):
+                if occ[n] or n in raised or dist[n] != d:
+                    continue
+                supported = any(
+                    not occ[m] and m not in raised and dist[m] == d - 1.0
+                    for m in self._neighbors(n)
+                )
+                if not supported:
+                    raised.add(n)
+                    queue.append(n)
+
+        for r in raised:
+            dist[r] = math.inf
+
+        # Refill from the untouched border
+        heap = []
+        for r in raised:
+            if occ[r]:
+                continue
+            d = min((dist[m] for m in self._neighbors(r) if not occ[m]), default=math.inf) + 1.0
+            if d < dist[r]:
+                dist[r] = d
+                heappush(heap, (d, r))
+
+        while heap:
+            d, u = heappop(heap)
+            if d > dist[u]:
+                continue
+            d += 1.0
+            for n in self._neighbors(u):
+                if not occ[n] and d < dist[n]:
+                    dist[n] = d
+                    heappush(heap, (d, n))
+
+    def cost_to_go(self, xy):
+        """Steps from xy to the goal (inf if unreachable)."""
+        self._sync()
+        x, y = xy
+        return self.dist[y * self.cols + x]
+
+    def plan_from(self, start_xy):
+        """
+        Greedy descent on the table.
+        returns: list[(x, y)] from start_xy to goal, or None if unreachable
+        """
+        self._sync()
+        cols, dist = self.cols, self.dist
+
+        cur = start_xy[1] * cols + start_xy[0]
+        goal = self.goal[1] * cols + self.goal[0]
+        path = [start_xy]
+
+        # start may sit on a blocked cell (drone cell), so step off it like astar does
+        while cur != goal:
+            nxt = min(
+                (n for n in self._neighbors(cur) if not self.occ[n]),
+                key=lambda n: dist[n],
+                default=None,
+            )
+            if nxt is None or dist[nxt] == math.inf or (len(path) > 1 and dist[nxt] >= dist[cur]):
+                return None
+            cur = nxt
+            path.append((cur % cols, cur // cols))
+        return path
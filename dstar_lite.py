@@ -0,0 +1,184 @@
+import math
+from heapq import heappush, heappop
+
+import world
+# incremental
+
+
+class DStarLite:
+    """
+    Incremental planner (D* Lite) for a fixed goal on world snapshots.
+
+    Searches backwards from the goal and keeps g/rhs between calls. Cell flips
+    from the world change feed are queued and repaired on the next plan_from(),
+    so a replan only touches the part of the search the change affected.
+
+    heuristic_fn: function (p, q) -> estimate cost, same shape as astar's.
+    It must be consistent (h(p, q) <= 1 + h(n, q) for every neighbor n) and return
+    the same values for the planner's whole lifetime: queued keys and km are built
+    from it across calls. Manhattan is; a heuristic that learns or follows the
+    world version is not.
+    """
+
+    def __init__(self, goal_xy, heuristic_fn):
+        self.goal = goal_xy
+        self.heuristic_fn = heuristic_fn
+
+        self._changes = world.ChangeQueue()
+        self.grid = world.snapshot()
+        self._reset()
+
+    def close(self):
+        """Stop listening for world changes."""
+        self._changes.close()
+
+    def _reset(self):
+        self.rows, self.cols = len(self.grid), len(self.grid[0])
+        self.g = {}
+        self.rhs = {self.goal: 0.0}
+        self.km = 0.0
+        self.start = None
+        self.last_start = None
+
+        self._heap = []
+        self._open = {}  # node -> key currently in the heap
+        self._push(self.goal, (self._h_raw(self.goal), 0.0))
+
+    # --- helpers ---
+
+    def _h_raw(self, p):
+        # before the first plan_from() there is no start yet
+        return 0.0 if self.start is None else self.heuristic_fn(p, self.start)
+
+    def _g(self, p):
+        return self.g.get(p, math.inf)
+
+    def _rhs(self, p):
+        return self.rhs.get(p, math.inf)
+
+    def _blocked(self, p):
+        # drone cell is always treated as free (same as astar's start)
+        x, y = p
+        return self.grid[y][x] == 1 and p != self.start
+
+    def _neighbors(self, p):
+        x, y = p
+        for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:  # 4-dir
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows:
+                yield (nx, ny)
+
+    def _cost(self, a, b):
+        if self._blocked(a) or self._blocked(b):
+            return math.inf
+        return 1.0  # each step cost 1
+
+    def _key(self, p):
+        m = min(self._g(p), self._rhs(p))
+        return (m + self._h_raw(p) + self.km, m)
+
+    def _push(self, p, key):
+        self._open[p] = key
+        heappush(self._heap, (key[0], key[1], p))
+
+    def _top(self):
+        """Peek the smallest live heap entry, dropping stale ones."""
+        while self._heap:
+            k1, k2, p = self._heap[0]
+            if self._open.get(p) == (k1, k2):
+                return (k1, k2), p
+            heappop(self._heap)
+        return None, None
+
+    # --- D* Lite core ---
+
+    def _update_vertex(self, u):
+        if u != self.goal:
+            best = math.inf
+            for s in self._neighbors(u):
+                c = self._cost(u, s) + self._g(s)
+                if c < best:
+                    best = c
+            self.rhs[u] = best
+
+        self._open.pop(u, None)
+        if self._g(u) != self._rhs(u):
+            self._push(u, self._key(u))
+
+    def _compute_shortest_path(self):
+        start = self.start
+        while True:
+            k_old, u = self._top()
+            if u is None:
+                break
+            if not (k_old < self._key(start) or self._rhs(start) != self._g(start)):
+                break
+
+            heappop(self._heap)
+            del self._open[u]
+
+            k_new = self._key(u)
+            if k_old < k_new:
+                self._push(u, k_new)
+            elif self._g(u) > self._rhs(u):
+                self.g[u] = self._rhs(u)
+                for p in self._neighbors(u):
+                    self._update_vertex(p)
+            else:
+                self.g[u] = math.inf
+                self._update_vertex(u)
+                for p in self._neighbors(u):
+                    self._update_vertex(p)
+
+    def plan_from(self, start_xy):
+        """
+        Repair the search for the current drone cell and return the path
+        list[(x, y)] from start_xy to the goal, or None if the goal is unreachable.
+        """
+        changed, reset = self._changes.drain()
+
+        # search this call on one immutable snapshot, taken after draining the queue
+        self.grid = world.snapshot()
+
+        if reset or (len(self.grid), len(self.grid[0])) != (self.rows, self.cols):
+            self._reset()
+            changed = set()
+
+        if self.start is None:
+            self.start = self.last_start = start_xy
+        elif start_xy != self.start:
+            # old/new drone cells flip between "forced free" and their grid value
+            changed.add(self.start)
+            changed.add(start_xy)
+            self.km += self.heuristic_fn(self.last_start, start_xy)
+            self.last_start = start_xy
+            self.start = start_xy
+
+        for c in changed:
+            self._update_vertex(c)
+            for p in self._neighbors(c):
+                self._update_vertex(p)
+
+        self._compute_shortest_path()
+        return self._extract_path()
+
+    def _extract_path(self):
+        s = self.start
+        if self._g(s) == math.inf and self._rhs(s) == math.inf:
+            return None
+
+        path = [s]
+        for _ in range(self.rows * self.cols):
+            if s == self.goal:
+                return path
+            best, best_c = None, math.inf
+            for n in self._neighbors(s):
+                c = self._cost(s, n) + self._g(n)
+                if c < best_c:
+                    best, best_c = n, c
+            if best is None:
+                return None
+            s = best
+            path.append(s)
+
+        return path if s == self.goal else None
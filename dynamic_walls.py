@@ -3,6 +3,7 @@ from typing import List, Optional, Set, Tuple
 
 import world
 from astar_core import astar
+from plan_cache import cached_plan
 
 
 def manhattan(p, goal):
@@ -26,11 +27,74 @@ def neighbors4_labels(label: str) -> Set[str]:
 
 
 def path_exists_unbounded(start_label: str, goal_label: str) -> bool:
-    """Check if a path exists using A* with no deadline (guaranteed complete)."""
+    """Check if a path exists using A* with no deadline (guaranteed complete, cached per grid state)."""
+    def compute(snap):
+        start_xy = world.label_to_xy(start_label)
+        goal_xy = world.label_to_xy(goal_label)
+        path_xy, _ = astar(snap, start_xy, goal_xy, manhattan, deadline_ms=None)
+        return path_xy is not None and len(path_xy) > 0
+
+    return cached_plan("exists", start_label, goal_label, compute)
+
+
+def disconnecting_cells(start_label: str, goal_label: str, snap=None) -> Optional[Set[str]]:
+    """
+    One DFS over the free cells from start (Tarjan low-link numbers).
+    Returns the labels of free cells that would cut start off from goal if
+    blocked, or None if goal is already unreachable.
+    snap: world snapshot to analyse (default: the latest one)
+    """
     start_xy = world.label_to_xy(start_label)
     goal_xy = world.label_to_xy(goal_label)
-    path_xy, _ = astar(world.grid, start_xy, goal_xy, manhattan, deadline_ms=None)
-    return path_xy is not None and len(path_xy) > 0
+
+    if snap is None:
+        snap = world.snapshot()
+    cells, cols, rows = snap.cells, snap.cols, snap.rows
+
+    def free_neighbors(p):
+        x, y = p
+        for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+            nx, ny = x + dx, y + dy
+            # start counts as free even if blocked (drone cell), same as astar
+            if 0 <= nx < cols and 0 <= ny < rows and (cells[ny * cols + nx] == 0 or (nx, ny) == start_xy):
+                yield (nx, ny)
+
+    disc = {start_xy: 0}
+    low = {start_xy: 0}
+    parent = {start_xy: None}
+    timer = 1
+
+    stack = [(start_xy, free_neighbors(start_xy))]
+    while stack:
+        u, it = stack[-1]
+        for v in it:
+            if v not in disc:
+                disc[v] = low[v] = timer
+                timer += 1
+                parent[v] = u
+                stack.append((v, free_neighbors(v)))
+                break
+            if v != parent[u]:
+                low[u] = min(low[u], disc[v])
+        else:
+            stack.pop()
+            p = parent[u]
+            if p is not None:
+                low[p] = min(low[p], low[u])
+
+    if goal_xy not in disc:
+        return None
+
+    # Only DFS ancestors of goal can separate it; ancestor p does iff the
+    # child subtree holding goal has no back edge above p.
+    cut = set()
+    v = goal_xy
+    while parent[v] is not None:
+        p = parent[v]
+        if p != start_xy and low[v] >= disc[p]:
+            cut.add(world.xy_to_label(*p))
+        v = p
+    return cut
 
 
 def choose_candidates(
@@ -38,11 +102,13 @@ def choose_candidates(
     current_path: Optional[List[str]],
     avoid: Set[str],
     ahead_window: int = 6,
+    snap=None,
 ) -> List[str]:
     """
     Build a list of candidate cells for wall placement.
     Prioritizes cells ahead on the current path, then random free cells.
     """
+    grid = world.snapshot() if snap is None else snap
     candidates: List[str] = []
 
     # First priority: cells ahead on the current path
@@ -57,14 +123,14 @@ def choose_candidates(
             if lbl in avoid:
                 continue
             x, y = world.label_to_xy(lbl)
-            if world.grid[y][x] == 0:
+            if grid[y][x] == 0:
                 candidates.append(lbl)
 
     # Second priority: random free cells
     all_labels = [
         world.xy_to_label(x, y)
-        for y in range(len(world.ROWS))
-        for x in range(len(world.COLS))
+        for y in range(grid.rows)
+        for x in range(grid.cols)
     ]
     random.shuffle(all_labels)
 
@@ -72,7 +138,7 @@ def choose_candidates(
         if lbl in avoid:
             continue
         x, y = world.label_to_xy(lbl)
-        if world.grid[y][x] == 0:
+        if grid[y][x] == 0:
             candidates.append(lbl)
 
     # Deduplicate while preserving order
@@ -97,7 +163,8 @@ def try_place_annoying_wall(
     
     - Never places on drone cell or goal cell
     - Optionally avoids drone's 4-neighbors
-    - Verifies path still exists after placement (using unbounded A*)
+    - Skips cells that would disconnect drone from goal (one articulation-point
+      pass over the grid instead of an A* per candidate)
     
     Returns the label where wall was placed, or None if no valid spot found.
     """
@@ -105,22 +172,26 @@ def try_place_annoying_wall(
     if forbid_neighbors:
         avoid |= neighbors4_labels(drone_label)
 
-    candidates = choose_candidates(drone_label, current_path, avoid)
-
-    tries = 0
-    for lbl in candidates:
-        if tries >= max_tries:
-            break
-        tries += 1
-
-        # Temporarily place wall
-        world.set_obstacle(lbl)
-
-        # Check if path still exists
-        if path_exists_unbounded(drone_label, goal_label):
-            return lbl  # Wall placed successfully
-
-        # Revert if it would block all paths
-        world.clear_obstacle(lbl)
+    # Decide on one snapshot, then place with a compare-and-set so a vision update
+    # landing in between can't turn the chosen cell into a disconnecting one.
+    for _ in range(3):
+        snap = world.snapshot()
+        cut = disconnecting_cells(drone_label, goal_label, snap)
+        if cut is None:
+            return None  # goal already unreachable, any wall would "block all paths"
+
+        candidates = choose_candidates(drone_label, current_path, avoid, snap=snap)
+
+        chosen = None
+        for lbl in candidates[:max_tries]:
+            if lbl not in cut:
+                chosen = lbl
+                break
+        if chosen is None:
+            return None
+
+        if world.apply_changes({chosen: 1}, expected_version=snap.version) is not None:
+            return chosen  # Wall placed successfully
+        # world moved on while we were choosing: look again
 
     return None
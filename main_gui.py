@@ -18,21 +18,19 @@ clear_obstacle = world.clear_obstacle
 reset_grid = world.reset_grid
 
 from v1basic import plan_v1
-from v2deadline import plan_v2
+from v2deadline import plan_v2_anytime
 from v3neural import plan_v3
+from v4jps import plan_v4
+from replan_mission import ReplanningMission, make_replanner, meters_to_label
 
 try:
     from commands import execute_path_on_cf, execute_replanning_on_cf, execute_v1_with_dynamic_checks
-    HAVE_CF = True
+    import crazyflie_control
+    from crazyflie_control import CrazyflieSession
+    HAVE_CF = crazyflie_control.Crazyflie is not None  # cflib installed, or CF_SIM set
 except Exception:
     HAVE_CF = False
 
-try:
-    from dynamic_walls import try_place_annoying_wall
-    HAVE_DYNAMIC_WALLS = True
-except Exception:
-    HAVE_DYNAMIC_WALLS = False
-
 try:
     from vision_motion_to_world import VisionObstacleUpdater
     HAVE_VISION = True
@@ -47,8 +45,9 @@ WINDOW_BG = "#f4f4f4"
 
 
 class PathfindingGUI:
-    def __init__(self, root):
+    def __init__(self, root, telemetry_dir=None):
         self.root = root
+        self.telemetry_dir = telemetry_dir  # None = don't record flights
         self.root.title("Smarter Paths – Grid Planner")
         self.root.configure(bg=WINDOW_BG)
 
@@ -66,8 +65,10 @@ class PathfindingGUI:
         self.chaos_regens_done = 0
         self.chaos_walls = []
         self.max_chaos_walls = 6
-        self._last_chaos_time = 0.0
         self._need_replan = True
+        self.replanner = None  # incremental planner, kept across replans for one (planner, goal)
+        self._replanner_key = None
+        self.mission = None  # ReplanningMission while a replanning flight is running
 
         # Vision (camera obstacles)
         self.vision_enabled = False
@@ -77,12 +78,23 @@ class PathfindingGUI:
         self.vision_stop_flag = False
         self.issue_squares = set()  # Track squares that caused path issues
 
+        # Crazyflie link, opened on the first flight and reused until the window closes
+        self.cf_session = None
+        self.cf_hover_between = tk.BooleanVar(value=False)
+        self.cf_trajectory = tk.BooleanVar(value=False)
+
         self.drag_mode = None
+        self._cell_items = {}  # (x, y) -> canvas rectangle id
 
         self._build_controls()
         self._build_canvas()
         self.redraw_grid()
 
+        # world changes can come from any thread (vision, chaos, flight worker)
+        world.subscribe(self._on_world_changes)
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def _build_controls(self):
         ctrl_frame = ttk.Frame(self.root, padding=10)
         ctrl_frame.grid(row=0, column=0, sticky="ew")
@@ -94,7 +106,7 @@ class PathfindingGUI:
         self.planner_combo = ttk.Combobox(
             ctrl_frame,
             textvariable=self.current_planner,
-            values=["v1 (basic A*)", "v2 (deadline A*)", "v3 (neural A*)"],
+            values=["v1 (basic A*)", "v2 (deadline A*)", "v3 (neural A*)", "v4 (jump point search)"],
             state="readonly",
             width=25,
         )
@@ -160,6 +172,15 @@ class PathfindingGUI:
             row=6, column=2, columnspan=2, sticky="w", pady=(6, 0)
         )
 
+        # Crazyflie session
+        ttk.Checkbutton(
+            ctrl_frame, text="Stay airborne between flights (returns to start)", variable=self.cf_hover_between
+        ).grid(row=7, column=0, columnspan=4, sticky="w", pady=(6, 0))
+
+        ttk.Checkbutton(
+            ctrl_frame, text="Smooth trajectory upload (v2/v3/v4 without chaos/vision)", variable=self.cf_trajectory
+        ).grid(row=8, column=0, columnspan=4, sticky="w", pady=(2, 0))
+
     def _build_canvas(self):
         canvas_width = GRID_COLS * CELL_SIZE
         canvas_height = GRID_ROWS * CELL_SIZE
@@ -183,8 +204,10 @@ class PathfindingGUI:
             self.current_planner.set("v1")
         elif text.startswith("v2"):
             self.current_planner.set("v2")
-        else:
+        elif text.startswith("v3"):
             self.current_planner.set("v3")
+        else:
+            self.current_planner.set("v4")
 
         # If leaving v3, force vision OFF
         if self.current_planner.get() != "v3" and self.vision_enabled:
@@ -197,7 +220,6 @@ class PathfindingGUI:
         self.chaos_btn.config(text=f"Chaos: {'ON' if self.chaos_enabled else 'OFF'}")
         if self.chaos_enabled:
             self.chaos_regens_done = 0
-            self._last_chaos_time = 0.0
 
     def toggle_vision(self):
         self.vision_enabled = not self.vision_enabled
@@ -244,6 +266,7 @@ class PathfindingGUI:
         def worker():
             try:
                 self.vision = VisionObstacleUpdater(cam_index=0)
+                last_report = time.perf_counter()
 
                 while not self.vision_stop_flag:
                     drone_lbl = self.drone_est_label
@@ -267,6 +290,8 @@ class PathfindingGUI:
                         
                         if self.should_replan_for_changes(added, removed) or cleared_issues:
                             self._need_replan = True
+                            if self.mission is not None:
+                                self.mission.need_replan = True
                             print(f"[VISION] Set _need_replan=True (flying={self.drone_est_label is not None})")
                             # Remove cleared issues from tracking
                             self.issue_squares -= removed
@@ -274,11 +299,17 @@ class PathfindingGUI:
                             if self.drone_est_label is None:
                                 self.root.after(0, self._auto_replan_if_needed)
 
-                        self.root.after(0, self.redraw_grid)
-
-                    time.sleep(0.03)  # ~33 Hz
+                    # no sleep: step() blocks (up to 1 s) until the camera has a newer
+                    # frame, and raises once the camera stopped
+                    now = time.perf_counter()
+                    if now - last_report >= 5.0:
+                        last_report = now
+                        print(f"[VISION] capture->world {self.vision.latency_avg_ms:.0f} ms avg, "
+                              f"{self.vision.capture.dropped} frames dropped")
             except Exception as e:
                 print("[VISION] stopped:", e)
+                if not self.vision_stop_flag:
+                    self.root.after(0, self._vision_failed)
 
         self.vision_thread = threading.Thread(target=worker, daemon=True)
         self.vision_thread.start()
@@ -293,9 +324,15 @@ class PathfindingGUI:
         self.vision = None
         self.vision_thread = None
 
+    def _vision_failed(self):
+        """Worker died on its own (camera gone): turn vision off like the button would."""
+        self.vision_enabled = False
+        self.vision_btn.config(text="Vision: OFF")
+        self.stop_vision()
+
     def should_replan_for_changes(self, added, removed):
-        # Only v2/v3 do replanning
-        if self.current_planner.get() not in ("v2", "v3"):
+        # Only v2/v3/v4 do replanning
+        if self.current_planner.get() not in ("v2", "v3", "v4"):
             return False
 
         # If we don't have a path, any change should cause a replan
@@ -317,7 +354,7 @@ class PathfindingGUI:
 
         # Replan from start (or drone position if flying)
         start = self.drone_est_label if self.drone_est_label else self.start_label
-        path, hit_deadline = self.compute_deadline_path_from(start)
+        path = self.replan_from(start)
 
         if path:
             self.current_path_labels = path
@@ -328,48 +365,72 @@ class PathfindingGUI:
         self._need_replan = False
         self.redraw_grid()
 
-    def redraw_grid(self):
-        self.canvas.delete("all")
+    def _on_world_changes(self, changes):
+        """World change feed: flag a replan if the path got blocked, recolor just those cells."""
+        if changes is None:
+            self._need_replan = True
+            self.root.after(0, self.redraw_grid)
+            return
+
+        path = set(self.current_path_labels[1:])
+        if any(c.new == 1 and xy_to_label(*c.cell) in path for c in changes):
+            self._need_replan = True
+
+        cells = [c.cell for c in changes]
+        self.root.after(0, lambda: self.update_cells(cells))
+
+    def _cell_fill(self, x, y, path_set):
+        label = xy_to_label(x, y)
 
+        # Drone marker (wins over other colors)
+        if self.drone_est_label is not None and label == self.drone_est_label:
+            return "#6bb8ff"  # blue
+        if label == self.start_label:
+            return "#6bd26b"  # green
+        if label == self.goal_label:
+            return "#ff6b6b"  # red
+        if grid[y][x] == 1:
+            return "#333333"  # obstacle
+        if label in path_set:
+            return "#ffd66b"  # yellow for path
+        return "#ffffff"  # free
+
+    def update_cells(self, cells):
+        """Recolor only the given (x, y) cells."""
+        if len(self._cell_items) != GRID_COLS * GRID_ROWS:
+            self.redraw_grid()
+            return
         path_set = set(self.current_path_labels)
+        for (x, y) in cells:
+            self.canvas.itemconfigure(self._cell_items[(x, y)], fill=self._cell_fill(x, y, path_set))
 
-        for y in range(GRID_ROWS):
-            for x in range(GRID_COLS):
-                x0 = x * CELL_SIZE
-                y0 = y * CELL_SIZE
-                x1 = x0 + CELL_SIZE
-                y1 = y0 + CELL_SIZE
-
-                label = xy_to_label(x, y)
-                cell_val = grid[y][x]
-
-                if label == self.start_label:
-                    fill = "#6bd26b"  # green
-                elif label == self.goal_label:
-                    fill = "#ff6b6b"  # red
-                elif cell_val == 1:
-                    fill = "#333333"  # obstacle
-                elif label in path_set:
-                    fill = "#ffd66b"  # yellow for path
-                else:
-                    fill = "#ffffff"  # free
-
-                # Drone marker (wins over other colors)
-                if self.drone_est_label is not None and label == self.drone_est_label:
-                    fill = "#6bb8ff"  # blue
-
-                self.canvas.create_rectangle(
-                    x0, y0, x1, y1,
-                    fill=fill,
-                    outline="#aaaaaa",
-                )
+    def redraw_grid(self):
+        # cells are drawn once, afterwards only their fill changes
+        if len(self._cell_items) != GRID_COLS * GRID_ROWS:
+            self.canvas.delete("all")
+            self._cell_items = {}
+
+            for y in range(GRID_ROWS):
+                for x in range(GRID_COLS):
+                    x0 = x * CELL_SIZE
+                    y0 = y * CELL_SIZE
+                    x1 = x0 + CELL_SIZE
+                    y1 = y0 + CELL_SIZE
+
+                    self._cell_items[(x, y)] = self.canvas.create_rectangle(
+                        x0, y0, x1, y1,
+                        fill="#ffffff",
+                        outline="#aaaaaa",
+                    )
 
-                self.canvas.create_text(
-                    x0 + CELL_SIZE / 2,
-                    y0 + CELL_SIZE / 2,
-                    text=label,
-                    font=("TkDefaultFont", 8),
-                )
+                    self.canvas.create_text(
+                        x0 + CELL_SIZE / 2,
+                        y0 + CELL_SIZE / 2,
+                        text=xy_to_label(x, y),
+                        font=("TkDefaultFont", 8),
+                    )
+
+        self.update_cells(self._cell_items)
 
     def _event_to_cell(self, event):
         col = event.x // CELL_SIZE
@@ -379,33 +440,9 @@ class PathfindingGUI:
         label = xy_to_label(col, row)
         return col, row, label
 
-    def _clamp(self, v, lo, hi):
-        return lo if v < lo else hi if v > hi else v
-
     def cf_meters_to_label(self, x_cf_m, y_cf_m):
-        """
-        Convert Crazyflie estimated (x,y) in meters -> grid label.
-
-        This matches your fly_moves() mapping exactly:
-          board right  => y_cf decreases
-          board down   => x_cf decreases
-        """
-        CELL_M = 0.10  # must match crazyflie_control.CELL
-
-        # Offsets in grid cells from the START cell
-        dcol = int(round((-y_cf_m) / CELL_M))
-        drow = int(round((-x_cf_m) / CELL_M))
-
-        start_col, start_row = label_to_xy(self.start_label)
-
-        col = start_col + dcol
-        row = start_row + drow
-
-        # Keep inside grid bounds so xy_to_label never index-errors
-        col = self._clamp(col, 0, GRID_COLS - 1)
-        row = self._clamp(row, 0, GRID_ROWS - 1)
-
-        return xy_to_label(col, row)
+        """Convert Crazyflie estimated (x,y) in meters -> grid label (relative to the start cell)."""
+        return meters_to_label(self.start_label, x_cf_m, y_cf_m)
 
     def on_canvas_press(self, event):
         col, row, label = self._event_to_cell(event)
@@ -508,17 +545,23 @@ class PathfindingGUI:
 
         print(f"[GUI] Running planner={planner}, start={self.start_label}, goal={self.goal_label}")
 
+        bound = None
         if planner == "v1":
             path = plan_v1(self.start_label, self.goal_label)
             hit_deadline = False
         elif planner == "v2":
-            path, hit_deadline = plan_v2(
+            # anytime: a complete path even when the deadline is tight
+            path, hit_deadline, bound = plan_v2_anytime(
                 self.start_label, self.goal_label, deadline_ms=deadline
             )
-        else:
+        elif planner == "v3":
             path, hit_deadline = plan_v3(
                 self.start_label, self.goal_label, deadline_ms=deadline
             )
+        else:
+            path, hit_deadline = plan_v4(
+                self.start_label, self.goal_label, deadline_ms=deadline
+            )
 
         if path is None or len(path) == 0:
             self.current_path_labels = []
@@ -531,82 +574,51 @@ class PathfindingGUI:
         self.redraw_grid()
 
         msg = f"[GUI] Path length: {len(path)}"
-        if planner in ("v2", "v3"):
+        if planner in ("v2", "v3", "v4"):
             msg += f" | Hit deadline? {'YES' if hit_deadline else 'NO'}"
+        if bound is not None:
+            msg += f" | Bound: {bound:.2f}x optimal"
         print(msg)
 
-    def compute_deadline_path_from(self, start_label: str):
-        """Compute path from start_label to goal using current planner's deadline."""
-        deadline = float(self.deadline_ms.get())
-        planner = self.current_planner.get()
+    def _close_replanner(self):
+        if self.replanner is not None:
+            self.replanner.close()
+            self.replanner = None
+            self._replanner_key = None
 
-        if planner == "v2":
-            return plan_v2(start_label, self.goal_label, deadline_ms=deadline)
-        if planner == "v3":
-            return plan_v3(start_label, self.goal_label, deadline_ms=deadline)
-        return None, False
-
-    def next_move_from_path(self, path_labels):
-        """Get the next move direction from current path."""
-        if not path_labels or len(path_labels) < 2:
+    def replan_from(self, start_label: str):
+        """Repair the path from start_label using the incremental planner (labels or None)."""
+        # Planner/goal can change between calls; search state is only valid for one of each
+        planner = self.current_planner.get()
+        key = (planner, self.goal_label)
+        if self.replanner is None or self._replanner_key != key:
+            self._close_replanner()
+            self.replanner = make_replanner(planner, label_to_xy(self.goal_label))
+            self._replanner_key = key
+
+        path_xy = self.replanner.plan_from(label_to_xy(start_label))
+        if not path_xy:
             return None
-        x1, y1 = label_to_xy(path_labels[0])
-        x2, y2 = label_to_xy(path_labels[1])
-        dx, dy = x2 - x1, y2 - y1
-        if dx == 1 and dy == 0:
-            return "right"
-        if dx == -1 and dy == 0:
-            return "left"
-        if dx == 0 and dy == 1:
-            return "down"
-        if dx == 0 and dy == -1:
-            return "up"
-        return None
-
-    def _record_chaos_wall(self, lbl):
-        """Track chaos wall and retire oldest if over limit."""
-        self.chaos_walls.append(lbl)
-        if len(self.chaos_walls) > self.max_chaos_walls:
-            old = self.chaos_walls.pop(0)
-            clear_obstacle(old)
-            print(f"[CHAOS] retired {old}")
-
-    def maybe_regenerate_walls(self):
-        """Attempt to place a chaos wall if conditions are met. Returns True if wall placed."""
-        if not self.chaos_enabled or not HAVE_DYNAMIC_WALLS:
-            return False
-
-        max_r = int(self.chaos_max_regens.get())
-        if max_r != 0 and self.chaos_regens_done >= max_r:
-            return False
-
-        period = float(self.chaos_period_s.get())
-        now = time.perf_counter()
-
-        if self._last_chaos_time != 0.0 and (now - self._last_chaos_time) < period:
-            return False
-
-        if self.drone_est_label is None:
-            return False
-
-        placed = try_place_annoying_wall(
-            drone_label=self.drone_est_label,
-            goal_label=self.goal_label,
-            current_path=self.current_path_labels,
-            forbid_neighbors=True,
-            max_tries=120,
-        )
-
-        self._last_chaos_time = now
-        self.chaos_regens_done += 1
-
-        if placed:
-            print(f"[CHAOS] placed {placed} ({self.chaos_regens_done}/{max_r})")
-            self._record_chaos_wall(placed)
-            self.redraw_grid()
-            return True
-
-        return False
+        return [xy_to_label(x, y) for (x, y) in path_xy]
+
+    def get_cf_session(self):
+        """Crazyflie session shared by all flights (connects on first use)."""
+        if self.cf_session is None:
+            self.cf_session = CrazyflieSession(telemetry_dir=self.telemetry_dir)
+        self.cf_session.hover_between = self.cf_hover_between.get()
+        self.cf_session.start_label = self.start_label  # moved start -> re-anchor first
+        return self.cf_session
+
+    def on_close(self):
+        """Window closed: land and disconnect the Crazyflie, stop vision."""
+        self.stop_vision()
+        if self.cf_session is not None:
+            try:
+                self.cf_session.close()
+            except Exception as e:
+                print("[GUI] Crazyflie close failed:", e)
+            self.cf_session = None
+        self.root.destroy()
 
     def fly_path(self):
         if not HAVE_CF:
@@ -631,6 +643,7 @@ class PathfindingGUI:
         print(f"[GUI] Executing path on Crazyflie: {self.current_path_labels}")
 
         planner = self.current_planner.get()
+        session = self.get_cf_session()
 
         # Ensure vision is ready for v3 if enabled
         if planner == "v3" and self.vision_enabled:
@@ -642,8 +655,11 @@ class PathfindingGUI:
             lbl = self.cf_meters_to_label(x_m, y_m)
 
             def ui_update():
+                old = self.drone_est_label
+                if old == lbl:
+                    return
                 self.drone_est_label = lbl
-                self.redraw_grid()
+                self.update_cells([label_to_xy(l) for l in (old, lbl) if l is not None])
 
             self.root.after(0, ui_update)
 
@@ -664,10 +680,10 @@ class PathfindingGUI:
                 try:
                     if self.chaos_enabled:
                         # v1 + Chaos: land if next step blocked
-                        execute_v1_with_dynamic_checks(self.current_path_labels, on_state=on_state)
+                        execute_v1_with_dynamic_checks(self.current_path_labels, on_state=on_state, session=session)
                     else:
                         # v1 normal: fixed path flight
-                        execute_path_on_cf(self.current_path_labels, compress=False, on_state=on_state)
+                        execute_path_on_cf(self.current_path_labels, compress=False, on_state=on_state, session=session)
                     self.root.after(0, flight_done)
                 except Exception as e:
                     self.root.after(0, lambda: flight_error(e))
@@ -675,12 +691,18 @@ class PathfindingGUI:
             threading.Thread(target=v1_worker, daemon=True).start()
             return
 
-        # v2/v3 behavior: segmented flight (no chaos/vision) or replanning loop (chaos OR vision ON)
+        # v2/v3/v4 behavior: segmented flight (no chaos/vision) or replanning loop (chaos OR vision ON)
         if not self.chaos_enabled and not self.vision_enabled:
-            # v2/v3 normal: compressed segmented flight (no dynamic obstacles)
+            # v2/v3 normal: compressed segmented flight (no dynamic obstacles),
+            # optionally as one uploaded trajectory
+            use_trajectory = self.cf_trajectory.get()
+
             def v2v3_fixed_worker():
                 try:
-                    execute_path_on_cf(self.current_path_labels, compress=True, on_state=on_state)
+                    execute_path_on_cf(
+                        self.current_path_labels, compress=True, on_state=on_state, session=session,
+                        trajectory=use_trajectory,
+                    )
                     self.root.after(0, flight_done)
                 except Exception as e:
                     self.root.after(0, lambda: flight_error(e))
@@ -693,55 +715,72 @@ class PathfindingGUI:
         # Initialize drone position to start label (logger will update it)
         self.drone_est_label = self.start_label
 
-        def step_provider():
-            # Exact same logic as v2 chaos mode
-            if self.drone_est_label is None:
-                return None
-            if self.drone_est_label == self.goal_label:
-                return None
-
-            # Maybe regenerate walls (chaos mode)
-            if self.maybe_regenerate_walls():
-                self._need_replan = True
-
-            # Check if next cell in path is blocked (vision obstacles) - same as chaos
-            if self.current_path_labels and len(self.current_path_labels) >= 2:
-                next_lbl = self.current_path_labels[1]
-                x, y = label_to_xy(next_lbl)
-                if grid[y][x] == 1:
-                    self._need_replan = True
-
-            # Replan if needed or if drone position doesn't match path start
-            if self._need_replan or not self.current_path_labels or self.current_path_labels[0] != self.drone_est_label:
-                path, hit = self.compute_deadline_path_from(self.drone_est_label)
-                if not path:
-                    print("[REPLAN] no path -> stopping")
-                    return None
-                self.current_path_labels = path
-                self._need_replan = False
-                self.root.after(0, self.redraw_grid)
-
-            move = self.next_move_from_path(self.current_path_labels)
-            if move is None:
-                return None
-
-            # Advance path
-            self.current_path_labels = self.current_path_labels[1:]
-            return move
+        mission = ReplanningMission(
+            planner,
+            self.start_label,
+            self.goal_label,
+            chaos=self.chaos_enabled,
+            chaos_period_s=float(self.chaos_period_s.get()),
+            chaos_max_regens=int(self.chaos_max_regens.get()),
+            chaos_walls=self.chaos_walls,
+            max_chaos_walls=self.max_chaos_walls,
+            regens_done=self.chaos_regens_done,
+            now=crazyflie_control.clock.monotonic,
+        )
+        mission.path = list(self.current_path_labels)
+        self.mission = mission
+
+        def sync():
+            # mission state (flight thread) -> what the grid shows
+            if self.mission is not mission:
+                return
+            self.current_path_labels = list(mission.path)
+            self.drone_est_label = mission.drone_label
+            self.redraw_grid()
+
+        mission.on_update = lambda: self.root.after(0, sync)
+
+        def on_mission_state(x_m, y_m, z_m):
+            mission.on_state(x_m, y_m, z_m)
+            on_state(x_m, y_m, z_m)
+
+        def finish():
+            self.chaos_regens_done = mission.regens_done
+            mission.close()
+            self.mission = None
+            print(f"[GUI] mission stats: {mission.stats}")
 
         def v2v3_worker():
             try:
-                execute_replanning_on_cf(step_provider, on_state=on_state)
+                execute_replanning_on_cf(
+                    mission.step_provider, on_state=on_mission_state, session=session,
+                    prepare_next=mission.prepare_next,
+                )
+                self.root.after(0, finish)
                 self.root.after(0, flight_done)
             except Exception as e:
+                self.root.after(0, finish)
                 self.root.after(0, lambda: flight_error(e))
 
         threading.Thread(target=v2v3_worker, daemon=True).start()
 
 
 def main():
+    global GRID_COLS, GRID_ROWS
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Grid pathfinding GUI")
+    ap.add_argument("--cols", type=int, default=GRID_COLS, help="arena columns (A, B, ..., Z, AA, ...)")
+    ap.add_argument("--rows", type=int, default=GRID_ROWS)
+    ap.add_argument("--record", action="store_true", help="keep flight telemetry in telemetry/ (see telemetry.py)")
+    args = ap.parse_args()
+
+    if (args.cols, args.rows) != (GRID_COLS, GRID_ROWS):
+        world.resize(args.cols, args.rows)
+        GRID_COLS, GRID_ROWS = len(COLS), len(ROWS)
+
     root = tk.Tk()
-    app = PathfindingGUI(root)
+    app = PathfindingGUI(root, telemetry_dir="telemetry" if args.record else None)
     root.mainloop()
 
 
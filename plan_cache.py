@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+import world
+# memo
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters (thread-safe)."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = int(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+plan_cache = LRUCache(maxsize=512)
+
+
+def cached_plan(planner: str, start_label: str, goal_label: str, compute, keep=None):
+    """
+    Look up a planner result for (planner, start, goal, grid_hash) of one world snapshot.
+    On a miss runs compute(snapshot) on that same snapshot, so the stored result always
+    matches its key even if the world changes mid-search, and stores it if
+    keep(result) is true (e.g. skip deadline-truncated paths).
+    Returned paths are shared, don't mutate them.
+    """
+    snap = world.snapshot()
+    key = (planner, start_label, goal_label, snap.grid_hash)
+    result = plan_cache.get(key, _MISSING)
+    if result is not _MISSING:
+        return result
+
+    result = compute(snap)
+    if keep is None or keep(result):
+        plan_cache.put(key, result)
+    return result
@@ -0,0 +1,244 @@
+import threading
+import time
+
+import world
+from v3neural import manhattan, plan_v3
+from dstar_lite import DStarLite
+from distance_field import DistanceField
+
+try:
+    from dynamic_walls import try_place_annoying_wall
+    HAVE_DYNAMIC_WALLS = True
+except Exception:
+    HAVE_DYNAMIC_WALLS = False
+
+# brains
+CELL_M = 0.10  # must match crazyflie_control.CELL
+
+
+def make_replanner(planner, goal_xy):
+    """
+    Incremental planner for one goal:
+      v2/v4 -> goal distance field (exact, replans are a table descent)
+      v3 -> D* Lite with Manhattan (the learned heuristic is neither consistent
+            nor fixed across world versions, which D* Lite's queued keys rely on)
+    """
+    if planner == "v3":
+        return DStarLite(goal_xy, manhattan)
+    return DistanceField(goal_xy)
+
+
+def next_move(path_labels):
+    """Direction of the first step of a path ("right"/"left"/"down"/"up"), or None."""
+    if not path_labels or len(path_labels) < 2:
+        return None
+    x1, y1 = world.label_to_xy(path_labels[0])
+    x2, y2 = world.label_to_xy(path_labels[1])
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 1 and dy == 0:
+        return "right"
+    if dx == -1 and dy == 0:
+        return "left"
+    if dx == 0 and dy == 1:
+        return "down"
+    if dx == 0 and dy == -1:
+        return "up"
+    return None
+
+
+def meters_to_label(start_label, x_cf_m, y_cf_m):
+    """
+    Crazyflie estimated (x, y) in meters -> grid label, same mapping as fly_moves():
+      board right  => y_cf decreases
+      board down   => x_cf decreases
+    Clamped to the grid.
+    """
+    # Offsets in grid cells from the START cell
+    dcol = int(round((-y_cf_m) / CELL_M))
+    drow = int(round((-x_cf_m) / CELL_M))
+
+    start_col, start_row = world.label_to_xy(start_label)
+    col = min(max(start_col + dcol, 0), world.grid.cols - 1)
+    row = min(max(start_row + drow, 0), world.grid.rows - 1)
+    return world.xy_to_label(col, row)
+
+
+class ReplanningMission:
+    """
+    Everything the replanning flight decides, without the GUI: hand step_provider,
+    prepare_next and on_state to crazyflie_control.fly_replanning().
+
+    Keeps the drone cell (from the state stream), the path it follows, the
+    incremental replanner and chaos walls. World changes that block the path
+    flag a replan; a plan made during the last move (prepare_next) is used when
+    the drone arrived where expected and the world didn't change meanwhile.
+
+    on_update(): optional, called (on the flight thread) when path or drone cell changed
+    now: time source for the chaos period (crazyflie_control.clock.monotonic in sim)
+    """
+
+    def __init__(
+        self,
+        planner,
+        start_label,
+        goal_label,
+        chaos=False,
+        chaos_period_s=5.0,
+        chaos_max_regens=10,
+        chaos_walls=None,
+        max_chaos_walls=6,
+        regens_done=0,
+        on_update=None,
+        now=time.perf_counter,
+    ):
+        self.planner = planner
+        self.start_label = start_label
+        self.goal_label = goal_label
+
+        self.chaos = chaos and HAVE_DYNAMIC_WALLS
+        self.chaos_period_s = chaos_period_s
+        self.chaos_max_regens = chaos_max_regens
+        self.chaos_walls = chaos_walls if chaos_walls is not None else []
+        self.max_chaos_walls = max_chaos_walls
+        self.regens_done = regens_done
+        self._last_chaos_time = 0.0
+
+        self.on_update = on_update
+        self.now = now
+
+        self.drone_label = start_label
+        self.path = []
+        self.need_replan = True
+        self.spec_plan = None  # (from_label, world.version, path) computed during the last move
+        self.stats = {"steps": 0, "replans": 0, "spec_hits": 0, "spec_misses": 0, "walls": 0}
+
+        self._lock = threading.Lock()  # replanner is shared by step_provider / prepare_next
+        self.replanner = make_replanner(planner, world.label_to_xy(goal_label))
+        world.subscribe(self._on_world_changes)
+
+    def close(self):
+        world.unsubscribe(self._on_world_changes)
+        self.replanner.close()
+
+    def _notify(self):
+        if self.on_update is not None:
+            self.on_update()
+
+    def _on_world_changes(self, changes):
+        if changes is None:
+            self.need_replan = True
+            return
+        ahead = set(self.path[1:])
+        if any(c.new == 1 and world.xy_to_label(*c.cell) in ahead for c in changes):
+            self.need_replan = True
+
+    # --- hooks for fly_replanning ---
+
+    def on_state(self, x_m, y_m, z_m):
+        lbl = meters_to_label(self.start_label, x_m, y_m)
+        if lbl != self.drone_label:
+            self.drone_label = lbl
+            self._notify()
+
+    def replan_from(self, start_label):
+        """Path (labels) from start_label to the goal, or None."""
+        with self._lock:
+            path_xy = self.replanner.plan_from(world.label_to_xy(start_label))
+        self.stats["replans"] += 1
+        if not path_xy:
+            return None
+        return [world.xy_to_label(x, y) for (x, y) in path_xy]
+
+    def maybe_regenerate_walls(self, from_label=None):
+        """
+        Attempt to place a chaos wall if conditions are met. Returns True if wall placed.
+        from_label: cell the wall is placed relative to (default: where the drone is)
+        """
+        if not self.chaos:
+            return False
+        if self.chaos_max_regens != 0 and self.regens_done >= self.chaos_max_regens:
+            return False
+
+        now = self.now()
+        if self._last_chaos_time != 0.0 and (now - self._last_chaos_time) < self.chaos_period_s:
+            return False
+
+        placed = try_place_annoying_wall(
+            drone_label=from_label or self.drone_label,
+            goal_label=self.goal_label,
+            current_path=self.path,
+            forbid_neighbors=True,
+            max_tries=120,
+        )
+
+        self._last_chaos_time = now
+        self.regens_done += 1
+
+        if not placed:
+            return False
+
+        print(f"[CHAOS] placed {placed} ({self.regens_done}/{self.chaos_max_regens})")
+        self.stats["walls"] += 1
+        self.chaos_walls.append(placed)
+        if len(self.chaos_walls) > self.max_chaos_walls:
+            old = self.chaos_walls.pop(0)
+            world.clear_obstacle(old)
+            print(f"[CHAOS] retired {old}")
+        return True
+
+    def step_provider(self):
+        if self.drone_label is None or self.drone_label == self.goal_label:
+            return None
+
+        # Maybe regenerate walls (chaos mode)
+        if self.maybe_regenerate_walls():
+            self.need_replan = True
+
+        # Plan made during the last move: only valid if it starts where the drone
+        # actually is and nothing in the world changed since it was computed
+        spec, self.spec_plan = self.spec_plan, None
+        if spec is not None:
+            spec_from, spec_version, spec_path = spec
+            if spec_path and spec_from == self.drone_label and spec_version == world.version:
+                self.path = spec_path
+                self.need_replan = False
+                self.stats["spec_hits"] += 1
+            else:
+                self.stats["spec_misses"] += 1
+                print("[PIPE] speculative plan stale -> replanning now")
+
+        # Replan if needed or if drone position doesn't match path start
+        if self.need_replan or not self.path or self.path[0] != self.drone_label:
+            path = self.replan_from(self.drone_label)
+            if not path and self.planner == "v3":
+                # last word goes to a full search before the mission is given up
+                path, _ = plan_v3(self.drone_label, self.goal_label)
+            if not path:
+                print("[REPLAN] no path -> stopping")
+                return None
+            self.path = path
+            self.need_replan = False
+
+        move = next_move(self.path)
+        if move is None:
+            return None
+
+        # Advance path
+        self.path = self.path[1:]
+        self.stats["steps"] += 1
+        self._notify()
+        return move
+
+    def prepare_next(self, move):
+        # Runs on a worker while `move` is flown: chaos wall + plan from the cell
+        # the drone is heading to (path[0] after step_provider advanced it)
+        if not self.path:
+            return
+        target = self.path[0]
+        if target == self.goal_label:
+            return
+        # drone_label is still the cell being left: place the wall around the target
+        self.maybe_regenerate_walls(from_label=target)
+        version = world.version
+        path = self.replan_from(target)
+        self.spec_plan = (target, version, path)
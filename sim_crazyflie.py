@@ -0,0 +1,488 @@
+import heapq
+import math
+import threading
+import time
+
+# sim
+
+DT = 0.005          # physics step (s)
+KP, KD = 25.0, 10.0  # setpoint tracking (critically damped, ~0.4 s settle)
+A_MAX = 5.0          # m/s^2, acceleration clamp
+
+
+class VirtualClock:
+    """
+    Simulated time. sleep() advances it, stepping the physics and firing due
+    log callbacks on the calling thread, so a mission runs as fast as Python can.
+
+    speed: None = no real waiting at all, otherwise real time is slept at 1/speed
+    (speed=1.0 looks like a real flight, handy with the GUI).
+    """
+
+    def __init__(self, speed=None):
+        self.speed = speed
+        self.t = 0.0
+        self._events = []  # (time, seq, period, fn) periodic callbacks
+        self._seq = 0
+        self._tickers = []  # fn(dt) stepped every DT
+        self._lock = threading.RLock()
+
+    def monotonic(self):
+        return self.t
+
+    def sleep(self, dt):
+        with self._lock:
+            end = self.t + max(0.0, dt)
+            while True:
+                nxt = self._events[0][0] if self._events else math.inf
+                stop = min(end, nxt)
+                start = self.t
+                while self.t < stop - 1e-12:
+                    h = min(DT, stop - self.t)
+                    for fn in self._tickers:
+                        fn(h)
+                    self.t += h
+                if self.speed:
+                    time.sleep((self.t - start) / self.speed)
+                if nxt > end:
+                    self.t = end
+                    return
+                _, seq, period, fn = heapq.heappop(self._events)
+                heapq.heappush(self._events, (nxt + period, seq, period, fn))
+                fn()
+
+    def wait(self, cond, timeout):
+        """
+        Stand-in for cond.wait(timeout): the only way anything changes is time passing.
+        Releases cond while time advances, like the real wait: the physics step fires
+        log callbacks of every simulated drone on this thread, and those take their
+        own session's condition.
+        """
+        cond.release()
+        try:
+            self.sleep(min(timeout, DT * 2))
+        finally:
+            cond.acquire()
+
+    def add_ticker(self, fn):
+        self._tickers.append(fn)
+
+    def every(self, period, fn):
+        """Call fn() every `period` seconds of simulated time; returns a handle for cancel()."""
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._events, (self.t + period, self._seq, period, fn))
+            return self._seq
+
+    def cancel(self, handle):
+        with self._lock:
+            self._events = [e for e in self._events if e[1] != handle]
+            heapq.heapify(self._events)
+
+
+def _min_jerk(p0, p1, T):
+    """Rest-to-rest setpoint from p0 to p1 over T seconds: t -> (pos, vel)."""
+    d = [b - a for a, b in zip(p0, p1)]
+
+    def sp(t):
+        if T <= 0.0 or t >= T:
+            return p1, (0.0, 0.0, 0.0)
+        tau = t / T
+        s = tau ** 3 * (10 - 15 * tau + 6 * tau * tau)
+        ds = 30 * tau * tau * (1 - tau) ** 2 / T
+        return tuple(a + s * k for a, k in zip(p0, d)), tuple(ds * k for k in d)
+
+    return sp, T
+
+
+def _polyval(c, t):
+    v = 0.0
+    for k in reversed(c):
+        v = v * t + k
+    return v
+
+
+def _polyder(c, t):
+    v = 0.0
+    for i in range(len(c) - 1, 0, -1):
+        v = v * t + i * c[i]
+    return v
+
+
+class Caller:
+    """Same shape as cflib's Caller: add_callback / remove_callback / call."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback(self, cb):
+        if cb not in self.callbacks:
+            self.callbacks.append(cb)
+
+    def remove_callback(self, cb):
+        if cb in self.callbacks:
+            self.callbacks.remove(cb)
+
+    def call(self, *args):
+        for cb in list(self.callbacks):
+            cb(*args)
+
+
+class SimLogConfig:
+    """Stand-in for cflib LogConfig."""
+
+    def __init__(self, name, period_in_ms):
+        self.name = name
+        self.period_in_ms = period_in_ms
+        self.variables = []
+        self.data_received_cb = Caller()
+        self.cf = None
+        self._handle = None
+
+    def add_variable(self, name, fetch_as="float"):
+        self.variables.append(name)
+
+    def start(self):
+        clock = self.cf.clock
+
+        def fire():
+            data = {v: self.cf.read_variable(v) for v in self.variables}
+            self.data_received_cb.call(int(clock.t * 1000), data, self)
+
+        self._handle = clock.every(self.period_in_ms / 1000.0, fire)
+
+    def stop(self):
+        if self._handle is not None:
+            self.cf.clock.cancel(self._handle)
+            self._handle = None
+
+    def delete(self):
+        self.stop()
+        if self in self.cf.log.log_blocks:
+            self.cf.log.log_blocks.remove(self)
+
+
+class SimLog:
+    def __init__(self, cf):
+        self.cf = cf
+        self.log_blocks = []
+
+    def add_config(self, logconf):
+        logconf.cf = self.cf
+        self.log_blocks.append(logconf)
+
+
+class SimParam:
+    def __init__(self, cf):
+        self.cf = cf
+        self.values = {}
+
+    def set_value(self, name, value):
+        self.values[name] = value
+        if name == "kalman.resetEstimation" and str(value) == "1":
+            self.cf.reset_estimate()
+
+    def get_value(self, name):
+        return self.values.get(name)
+
+
+class SimMemoryElement:
+    TYPE_TRAJ = 0x12
+
+
+class SimPoly:
+    def __init__(self, values=None):
+        self.values = list(values) if values is not None else [0.0] * 8
+
+
+class SimPoly4D:
+    def __init__(self, duration, x=None, y=None, z=None, yaw=None):
+        self.duration = duration
+        self.x = x or SimPoly()
+        self.y = y or SimPoly()
+        self.z = z or SimPoly()
+        self.yaw = yaw or SimPoly()
+
+
+class SimTrajectoryMemory:
+    type = SimMemoryElement.TYPE_TRAJ
+    size = 4096
+
+    def __init__(self):
+        self.trajectory = []
+        self.stored = []  # what the "firmware" holds after a write
+
+    def write_data_sync(self):
+        self.stored = list(self.trajectory)
+        return True
+
+    def write_data(self, write_finished_cb, write_failed_cb=None):
+        self.stored = list(self.trajectory)
+        write_finished_cb(self, 0)
+
+
+class SimMemory:
+    def __init__(self):
+        self.traj = SimTrajectoryMemory()
+
+    def get_mems(self, type_):
+        return [self.traj] if type_ == SimMemoryElement.TYPE_TRAJ else []
+
+
+class SimCrazyflie:
+    """
+    Drop-in for cflib's Crazyflie with a point-mass body on a virtual clock.
+
+    The body follows the high-level commander's setpoint with a PD loop
+    (acceleration clamped to A_MAX). Everything is in the estimator frame, and a
+    Kalman reset puts the estimate back at (0, 0, z), like the real one.
+    Log blocks can read stateEstimate.{x,y,z,vx,vy,vz}, kalman.varP{X,Y,Z},
+    stabilizer.{roll,pitch,yaw} (tilt needed for the current acceleration) and pm.vbat.
+    """
+
+    def __init__(self, clock, rw_cache=None):
+        self.clock = clock
+        self.param = SimParam(self)
+        self.log = SimLog(self)
+        self.mem = SimMemory()
+        self.link_uri = None
+
+        self.connected = Caller()
+        self.fully_connected = Caller()
+        self.connection_failed = Caller()
+        self.disconnected = Caller()
+
+        self.pos = [0.0, 0.0, 0.0]
+        self.vel = [0.0, 0.0, 0.0]
+        self.flying = False
+        self.acc = [0.0, 0.0, 0.0]
+        self.vbat = 4.15
+        self.var_p = 1.0  # Kalman position variance, decays after a reset
+        self._setpoint = None  # (fn t -> (pos, vel), duration, start time)
+        self._landing = False
+        self.trajectories = {}  # id -> list of pieces
+
+        clock.add_ticker(self._step)
+
+    # --- link ---
+
+    def open_link(self, uri):
+        self.link_uri = uri
+        self.connected.call(uri)
+        self.fully_connected.call(uri)
+
+    def close_link(self):
+        for lg in self.log.log_blocks:
+            lg.stop()
+        uri, self.link_uri = self.link_uri, None
+        self.disconnected.call(uri)
+
+    def is_connected(self):
+        return self.link_uri is not None
+
+    # --- state ---
+
+    def reset_estimate(self):
+        self.pos[0] = self.pos[1] = 0.0
+        self.vel = [0.0, 0.0, 0.0]
+        self.var_p = 1.0
+
+    def read_variable(self, name):
+        if name.startswith("stateEstimate."):
+            k = name.split(".", 1)[1]
+            if k in ("x", "y", "z"):
+                return self.pos["xyz".index(k)]
+            if k in ("vx", "vy", "vz"):
+                return self.vel["xyz".index(k[1])]
+        if name.startswith("kalman.varP"):
+            return self.var_p
+        if name == "stabilizer.pitch":
+            return math.degrees(math.atan2(self.acc[0], 9.81))
+        if name == "stabilizer.roll":
+            return -math.degrees(math.atan2(self.acc[1], 9.81))
+        if name == "pm.vbat":
+            return self.vbat
+        return 0.0
+
+    def set_setpoint(self, fn, duration):
+        self._setpoint = (fn, duration, self.clock.t)
+
+    def _step(self, h):
+        self.var_p = max(1e-6, self.var_p * math.exp(-h / 0.15))  # estimator converging
+        if not self.flying or self._setpoint is None:
+            return
+
+        self.vbat = max(3.0, self.vbat - 0.002 * h)  # ~0.1 V per minute of flight
+        fn, duration, t0 = self._setpoint
+        sp, sv = fn(self.clock.t - t0)
+        for i in range(3):
+            a = KP * (sp[i] - self.pos[i]) + KD * (sv[i] - self.vel[i])
+            a = max(-A_MAX, min(A_MAX, a))
+            self.acc[i] = a
+            self.vel[i] += a * h
+            self.pos[i] += self.vel[i] * h
+
+        if self._landing and self.clock.t - t0 >= duration and self.pos[2] < 0.02:
+            self.flying = False
+            self._landing = False
+            self.pos[2] = 0.0
+            self.vel = [0.0, 0.0, 0.0]
+
+
+class SimHighLevelCommander:
+    """Drop-in for cflib's HighLevelCommander (takeoff/land/go_to/trajectories)."""
+
+    def __init__(self, cf):
+        self.cf = cf
+
+    def _target(self):
+        # new commands start from where the current setpoint is now, like the onboard
+        # planner (the measured position only before there is one)
+        cf = self.cf
+        if not cf.flying or cf._setpoint is None:
+            return tuple(cf.pos)
+        fn, duration, t0 = cf._setpoint
+        return tuple(fn(cf.clock.t - t0)[0])
+
+    def takeoff(self, absolute_height_m, duration_s, group_mask=0, yaw=0.0):
+        cf = self.cf
+        cf.flying = True
+        cf._landing = False
+        x, y, z = cf.pos
+        cf.set_setpoint(*_min_jerk((x, y, z), (x, y, absolute_height_m), duration_s))
+
+    def land(self, absolute_height_m, duration_s, group_mask=0, yaw=0.0):
+        cf = self.cf
+        x, y, z = cf.pos
+        cf._landing = True
+        cf.set_setpoint(*_min_jerk((x, y, z), (x, y, absolute_height_m), duration_s))
+
+    def stop(self, group_mask=0):
+        self.cf.flying = False
+
+    def go_to(self, x, y, z, yaw, duration_s, relative=False, group_mask=0):
+        cf = self.cf
+        p0 = self._target()
+        p1 = (p0[0] + x, p0[1] + y, p0[2] + z) if relative else (x, y, z)
+        cf.set_setpoint(*_min_jerk(p0, p1, duration_s))
+
+    def define_trajectory(self, trajectory_id, offset, n_pieces, type=0):
+        stored = self.cf.mem.traj.stored
+        self.cf.trajectories[trajectory_id] = stored[offset:offset + n_pieces]
+
+    def start_trajectory(self, trajectory_id, time_scale=1.0, relative=False, reversed=False, group_mask=0):
+        pieces = self.cf.trajectories[trajectory_id]
+        origin = self._target() if relative else (0.0, 0.0, 0.0)
+        starts = []
+        t = 0.0
+        for p in pieces:
+            starts.append(t)
+            t += p.duration * time_scale
+        total = t
+
+        def sp(t):
+            t = min(max(t, 0.0), total)
+            i = max(0, min(len(pieces) - 1, sum(1 for s in starts if s <= t) - 1))
+            p, tl = pieces[i], (t - starts[i]) / time_scale
+            tl = min(tl, p.duration)
+            pos = tuple(o + _polyval(ax.values, tl) for o, ax in zip(origin, (p.x, p.y, p.z)))
+            vel = tuple(_polyder(ax.values, tl) / time_scale for ax in (p.x, p.y, p.z))
+            return pos, vel
+
+        self.cf.set_setpoint(sp, total)
+
+
+class SimBackend:
+    """
+    Everything crazyflie_control needs from cflib, simulated:
+        crazyflie_control.use_backend(SimBackend())
+    cfs are the SimCrazyflies created so far (last_cf the newest), for inspection.
+    """
+
+    HighLevelCommander = SimHighLevelCommander
+    LogConfig = SimLogConfig
+    MemoryElement = SimMemoryElement
+    Poly = SimPoly
+    Poly4D = SimPoly4D
+
+    def __init__(self, speed=None):
+        self.clock = VirtualClock(speed)
+        self.cfs = []
+        self.last_cf = None
+
+    def Crazyflie(self, rw_cache=None):
+        self.last_cf = SimCrazyflie(self.clock, rw_cache=rw_cache)
+        self.cfs.append(self.last_cf)
+        return self.last_cf
+
+    def init_drivers(self):
+        pass
+
+
+def run_mission(planner, start, goal, chaos=False, chaos_period_s=5.0, chaos_max_regens=10, telemetry_dir=None):
+    """One headless replanning flight on the simulator; returns (virtual s, wall s, stats)."""
+    import crazyflie_control
+    from replan_mission import ReplanningMission
+
+    backend = SimBackend()
+    crazyflie_control.use_backend(backend)
+    mission = ReplanningMission(
+        planner, start, goal,
+        chaos=chaos, chaos_period_s=chaos_period_s, chaos_max_regens=chaos_max_regens,
+        now=backend.clock.monotonic,
+    )
+    t0 = time.perf_counter()
+    try:
+        with crazyflie_control.CrazyflieSession(telemetry_dir=telemetry_dir) as session:
+            crazyflie_control.fly_replanning(
+                mission.step_provider, on_state=mission.on_state, session=session,
+                prepare_next=mission.prepare_next,
+            )
+    finally:
+        mission.close()
+    stats = dict(mission.stats, arrived=mission.drone_label == goal)
+    return backend.clock.t, time.perf_counter() - t0, stats
+
+
+def main():
+    import argparse
+    import random
+
+    import world
+
+    ap = argparse.ArgumentParser(description="Headless replanning flights on the simulated Crazyflie")
+    ap.add_argument("--planner", default="v2", choices=["v2", "v3", "v4"])
+    ap.add_argument("--start", default="A1")
+    ap.add_argument("--goal", default=None, help="default: bottom-right cell")
+    ap.add_argument("--cols", type=int, default=len(world.COLS))
+    ap.add_argument("--rows", type=int, default=len(world.ROWS))
+    ap.add_argument("--chaos", action="store_true", help="drop walls on the path during the flight")
+    ap.add_argument("--chaos-period", type=float, default=5.0, help="seconds (simulated) between walls")
+    ap.add_argument("--runs", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--record", action="store_true", help="keep telemetry in telemetry/ (see telemetry.py)")
+    args = ap.parse_args()
+
+    world.resize(args.cols, args.rows)
+    goal = args.goal or world.xy_to_label(args.cols - 1, args.rows - 1)
+    random.seed(args.seed)  # dynamic_walls picks with the random module
+
+    total_sim = total_wall = 0.0
+    for run in range(args.runs):
+        world.reset_grid()
+        sim_s, wall_s, stats = run_mission(
+            args.planner, args.start, goal, args.chaos, args.chaos_period,
+            telemetry_dir="telemetry" if args.record else None,
+        )
+        total_sim += sim_s
+        total_wall += wall_s
+        print(f"[SIM] run {run + 1}/{args.runs}: {sim_s:.1f}s flight in {wall_s:.2f}s wall "
+              f"({sim_s / max(wall_s, 1e-9):.0f}x) | {stats}")
+
+    print(f"[SIM] {args.runs} runs: {total_sim:.1f}s simulated, {total_wall:.2f}s wall, "
+          f"{total_sim / max(total_wall, 1e-9):.0f}x real time")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
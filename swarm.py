@@ -0,0 +1,345 @@
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import world
+import crazyflie_control
+from crazyflie_control import CELL, CrazyflieSession
+from distance_field import goal_distances
+
+# swrm
+
+STEP_S = 2.0  # seconds per lockstep move (one cell), same pace as fly_moves
+MIN_SEPARATION = 0.15  # m between drone centers; a Crazyflie with props is wider than one cell
+
+
+def swarm_uris(n, channel=80, rate="2M", base=0xE7E7E7E701):
+    """Default URIs for n drones on one radio: consecutive addresses from E7E7E7E701."""
+    return [f"radio://0/{channel}/{rate}/{base + i:X}" for i in range(n)]
+
+
+# --- planning: prioritized space-time A* ---
+
+def space_time_astar(grid, start, goal, dist, reserved, parked, last_use, max_t):
+    """
+    A* over (x, y, t): each tick a drone moves one cell (4-dir) or waits.
+    A cell is only usable at t if it is not reserved at t - 1, t or t + 1.
+    Reservations cover the 8 cells around every earlier drone (see _around), so
+    drones never share, swap or follow into a cell, and never fly side by side.
+
+    reserved: {(x, y, t)} cells taken by drones planned earlier
+    parked: {(x, y): t} cells next to a finished drone from t onwards
+    last_use: {(x, y): t} last tick any earlier drone is on or next to a cell (can't park before it)
+    dist: cost-to-go table for goal (exact, ignores other drones)
+    returns: list of (x, y) per tick, or None
+    """
+    cols = len(grid[0])
+    gx, gy = goal
+    sx, sy = start
+
+    def usable(x, y, t):
+        if (x, y, t) in reserved or (x, y, t - 1) in reserved or (x, y, t + 1) in reserved:
+            return False
+        return parked.get((x, y), max_t + 2) > t + 1
+
+    h0 = dist[sy * cols + sx]
+    if h0 == float("inf") or not usable(sx, sy, 0):
+        return None
+
+    open_heap = [(h0, 0, sx, sy)]
+    came_from = {(sx, sy, 0): None}
+    while open_heap:
+        _, t, x, y = heapq.heappop(open_heap)
+        if (x, y) == (gx, gy) and last_use.get((x, y), -2) < t - 1:
+            path = []
+            node = (x, y, t)
+            while node is not None:
+                path.append(node[:2])
+                node = came_from[node]
+            return path[::-1]
+        if t >= max_t:
+            continue
+
+        nt = t + 1
+        for dx, dy in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < cols and 0 <= ny < len(grid)) or grid[ny][nx]:
+                continue
+            if not usable(nx, ny, nt):
+                continue
+            node = (nx, ny, nt)
+            if node in came_from:
+                continue
+            came_from[node] = (x, y, t)
+            heapq.heappush(open_heap, (nt + dist[ny * cols + nx], nt, nx, ny))
+    return None
+
+
+def _around(cell):
+    """cell and its 8 neighbors (may fall outside the grid, which is harmless for lookups)"""
+    x, y = cell
+    return [(x + dx, y + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+def _too_close(cells):
+    return any(max(abs(a[0] - b[0]), abs(a[1] - b[1])) < 2
+               for i, a in enumerate(cells) for b in cells[i + 1:])
+
+
+def plan_prioritized(starts, goals, grid=None):
+    """
+    Collision-free paths for several drones on one grid (cells as (x, y)),
+    never in neighboring cells, diagonals included (see space_time_astar).
+    Drones are planned one at a time, each around the ones before it (longest
+    trip first); if one gets stuck it moves to the front and everyone is replanned.
+    returns: list of paths (one (x, y) per tick, all padded to the same length
+    by waiting at the goal), or None
+    """
+    snap = grid if grid is not None else world.snapshot()
+    n = len(starts)
+    if _too_close(starts) or _too_close(goals):
+        raise ValueError("starts and goals must be at least two cells apart")
+
+    dists = [goal_distances(snap, g) for g in goals]
+    cols = len(snap[0])
+    order = sorted(range(n), key=lambda i: -dists[i][starts[i][1] * cols + starts[i][0]])
+    max_t = len(snap) * cols + 2 * n
+
+    for _ in range(n):
+        reserved, parked, last_use = set(), {}, {}
+        # drones not planned yet are still sitting on their start cells
+        waiting = {i: [(*c, 0) for c in _around(starts[i])] for i in order}
+        paths = [None] * n
+        stuck = None
+        for i in order:
+            del waiting[i]
+            blocked = reserved.union(*waiting.values())
+            path = space_time_astar(snap, starts[i], goals[i], dists[i], blocked, parked, last_use, max_t)
+            if path is None:
+                stuck = i
+                break
+            for t, cell in enumerate(path):
+                for c in _around(cell):
+                    reserved.add((*c, t))
+                    last_use[c] = max(last_use.get(c, -1), t)
+            for c in _around(path[-1]):
+                parked[c] = min(parked.get(c, len(path) - 1), len(path) - 1)
+            paths[i] = path
+        if stuck is None:
+            T = max(len(p) for p in paths)
+            return [p + [p[-1]] * (T - len(p)) for p in paths]
+        if order[0] == stuck:
+            return None
+        order.remove(stuck)
+        order.insert(0, stuck)
+    return None
+
+
+# --- execution ---
+
+class Swarm:
+    """
+    One CrazyflieSession per URI, connected / closed in parallel.
+    Each drone's estimator frame starts at its own start cell (Kalman reset on
+    takeoff), exactly like a single-drone mission. Telemetry goes to
+    telemetry_dir/cf<i>/ (None = don't record, the default).
+
+    with Swarm(swarm_uris(3)) as sw:
+        fly_swarm(sw, ["A1", "D1", "A7"], ["D7", "A7", "D1"])
+    """
+
+    def __init__(self, uris, telemetry_dir=None, **session_kwargs):
+        self.sessions = [
+            CrazyflieSession(
+                uri=uri,
+                telemetry_dir=os.path.join(telemetry_dir, f"cf{i}") if telemetry_dir else None,
+                **session_kwargs,
+            )
+            for i, uri in enumerate(uris)
+        ]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _each(self, fn):
+        with ThreadPoolExecutor(max_workers=len(self.sessions)) as pool:
+            return list(pool.map(fn, range(len(self.sessions))))
+
+    def connect(self):
+        self._each(lambda i: self.sessions[i].connect())
+
+    def close(self):
+        def close_one(i):
+            try:
+                self.sessions[i].close()
+            except Exception as e:
+                print(f"[SWARM] cf{i} close failed:", e)
+        self._each(close_one)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fly_tick(swarm, paths, t, cells, step_s):
+    """Send every drone that moves at tick t its go_to, then wait until they all arrived."""
+    targets = []
+    for s, p, (sx, sy) in zip(swarm.sessions, paths, cells):
+        if p[t + 1] != p[t]:
+            # board -> estimator frame (origin = start cell), as in fly_moves
+            cx, cy = p[t + 1]
+            targets.append((s, s.start_go_to((sy - cy) * CELL, (sx - cx) * CELL, step_s)))
+
+    deadline = crazyflie_control.clock.monotonic() + step_s + 0.3
+    for s, target in targets:
+        remaining = max(0.0, deadline - crazyflie_control.clock.monotonic())
+        if not s.wait_until_arrived(target, timeout=remaining):
+            print(f"[SWARM] {s.uri} not at ({target[0]:.2f}, {target[1]:.2f}) in time")
+
+
+def fly_swarm(swarm, start_labels, goal_labels, on_state=None, step_s=STEP_S):
+    """
+    Plan collision-free paths for every drone and fly them in lockstep: each tick
+    every drone gets its go_to at once, and the next tick starts when all of
+    them arrived. Before each tick, if the world changed under a remaining path,
+    everyone is replanned from where they are. Sessions that hover between
+    missions fly back to their start cells the same way.
+
+    on_state(i, x, y, z): per-drone state callback (drone i's estimator frame)
+    returns: number of ticks flown (None if no plan)
+    """
+    n = len(swarm)
+    if len(start_labels) != n or len(goal_labels) != n:
+        raise ValueError(f"need {n} starts and goals")
+    goals = [world.label_to_xy(g) for g in goal_labels]
+    cells = [world.label_to_xy(s) for s in start_labels]  # estimator origins
+
+    snap = world.snapshot()
+    paths = plan_prioritized(cells, goals, snap)
+    if paths is None:
+        print("[SWARM] no collision-free plan")
+        return None
+    print(f"[SWARM] {n} drones, {len(paths[0]) - 1} ticks")
+
+    def begin(i):
+        cb = None
+        if on_state is not None:
+            cb = lambda x, y, z: on_state(i, x, y, z)
+        swarm.sessions[i].start_label = start_labels[i]
+        swarm.sessions[i].begin_mission(cb)
+
+    swarm._each(begin)
+    ticks = 0
+    try:
+        t = 0
+        while t + 1 < len(paths[0]):
+            latest = world.snapshot()
+            if latest.version != snap.version:
+                snap = latest
+                if any(snap[y][x] for p in paths for (x, y) in p[t + 1:]):
+                    print("[SWARM] path blocked -> replanning all drones")
+                    replanned = plan_prioritized([p[t] for p in paths], goals, snap)
+                    if replanned is None:
+                        print("[SWARM] no collision-free plan -> stopping")
+                        break
+                    paths, t = replanned, 0
+                    continue
+
+            _fly_tick(swarm, paths, t, cells, step_s)
+            t += 1
+            ticks += 1
+
+        if all(s.hover_between and not s.land_requested for s in swarm.sessions):
+            # end_mission would fly everyone straight back to the origins at once,
+            # through each other: plan the way back like any other mission
+            back = plan_prioritized([p[t] for p in paths], cells, world.snapshot())
+            if back is None:
+                print("[SWARM] no collision-free way back -> landing in place")
+                for s in swarm.sessions:
+                    s.land_requested = True
+            else:
+                for tb in range(len(back[0]) - 1):
+                    _fly_tick(swarm, back, tb, cells, step_s)
+    finally:
+        swarm._each(lambda i: swarm.sessions[i].end_mission())
+    return ticks
+
+
+def main():
+    import argparse
+    import math
+    import time
+
+    ap = argparse.ArgumentParser(description="Fly several Crazyflies at once on collision-free paths")
+    ap.add_argument("--starts", nargs="+", required=True, help="start cell per drone, e.g. A1 D1")
+    ap.add_argument("--goals", nargs="+", required=True, help="goal cell per drone, e.g. D7 A7")
+    ap.add_argument("--uris", nargs="+", help="default: consecutive addresses from E7E7E7E701")
+    ap.add_argument("--cols", type=int, default=len(world.COLS))
+    ap.add_argument("--rows", type=int, default=len(world.ROWS))
+    ap.add_argument("--walls", nargs="*", default=[], help="blocked cells")
+    ap.add_argument("--sim", action="store_true", help="fly the simulator (sim_crazyflie)")
+    ap.add_argument("--record", action="store_true", help="keep telemetry in telemetry/cf<i>/ (see telemetry.py)")
+    ap.add_argument("--missions", type=int, default=1, help="fly this many missions on one connection")
+    ap.add_argument("--hover-between", action="store_true",
+                    help="stay up between missions (fly back to the start cells) instead of landing")
+    args = ap.parse_args()
+
+    if (args.cols, args.rows) != (len(world.COLS), len(world.ROWS)):
+        world.resize(args.cols, args.rows)
+    world.apply_changes({w: 1 for w in args.walls})
+
+    backend = None
+    if args.sim:
+        import sim_crazyflie
+        backend = sim_crazyflie.SimBackend()
+        crazyflie_control.use_backend(backend)
+
+    uris = args.uris or swarm_uris(len(args.starts))
+
+    closest = [math.inf]
+    origins = [world.label_to_xy(lbl) for lbl in args.starts]  # estimator origins of this mission
+    if backend is not None:
+        # the sim knows where every body really is: check separation each physics step
+
+        def check(h):
+            pts = [(sx * CELL - cf.pos[1], sy * CELL - cf.pos[0])
+                   for cf, (sx, sy) in zip(backend.cfs, origins) if cf.flying]
+            for a in range(len(pts)):
+                for b in range(a + 1, len(pts)):
+                    closest[0] = min(closest[0], math.dist(pts[a], pts[b]))
+
+    t0 = time.perf_counter()
+    ticks = 0
+    starts, goals = args.starts, args.goals
+    with Swarm(uris, telemetry_dir="telemetry" if args.record else None,
+               hover_between=args.hover_between) as sw:
+        if backend is not None:
+            backend.clock.add_ticker(check)
+        for _ in range(args.missions):
+            flown = fly_swarm(sw, starts, goals)
+            if flown is None:
+                ticks = None
+                break
+            ticks += flown
+            if not args.hover_between:
+                # landed on the goals: the next mission flies back from there
+                starts, goals = goals, starts
+                origins[:] = [world.label_to_xy(lbl) for lbl in starts]
+    wall = time.perf_counter() - t0
+
+    msg = f"[SWARM] {ticks} ticks, {wall:.2f}s wall"
+    if backend is not None:
+        msg += f", {backend.clock.t:.1f}s simulated"
+        if closest[0] < math.inf:
+            msg += f" | closest approach {closest[0]:.3f} m"
+    print(msg)
+    if closest[0] < MIN_SEPARATION:
+        print(f"[SWARM] drones came closer than {MIN_SEPARATION:.2f} m")
+        return 1
+    return 0 if ticks is not None else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
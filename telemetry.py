@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# tele
+
+# One cflib log block carries at most ~26 bytes, so the variables are split
+# over a few blocks; all of them run at the same period.
+BLOCKS = {
+    "state": ["stateEstimate.x", "stateEstimate.y", "stateEstimate.z",
+              "stateEstimate.vx", "stateEstimate.vy", "stateEstimate.vz"],
+    "attitude": ["stabilizer.roll", "stabilizer.pitch", "stabilizer.yaw", "pm.vbat"],
+    "variance": ["kalman.varPX", "kalman.varPY", "kalman.varPZ"],
+}
+
+# Record layout: onboard time in seconds, then one float32 per logged variable
+FIELDS = ("x", "y", "z", "vx", "vy", "vz", "roll", "pitch", "yaw", "vbat", "varPX", "varPY", "varPZ")
+DTYPE = np.dtype([("t", "<f8")] + [(f, "<f4") for f in FIELDS])
+
+_COLUMN = {var: 1 + FIELDS.index(var.split(".", 1)[1]) for vars_ in BLOCKS.values() for var in vars_}
+
+TELEMETRY_DIR = "telemetry"
+
+
+class TelemetryRecorder:
+    """
+    High-rate flight log: every BLOCKS variable at period_ms (10 ms = 100 Hz).
+
+    Samples land in a preallocated NumPy ring buffer (capacity rows) from the
+    cflib log thread; that's all the log callback does besides handing the
+    position to on_position(x, y, z). One row is written per "state" sample,
+    carrying the latest attitude / variance values.
+
+    A background thread copies new rows into a memory-mapped file every
+    flush_s (raw DTYPE records, plus <path>.json describing them); load() reads
+    it back. Slower consumers (the GUI) use add_watcher(fn, hz) and get
+    fn(x, y, z) at most hz times per second.
+    """
+
+    def __init__(self, cf, log_config, path=None, period_ms=10, capacity=4096, flush_s=0.5,
+                 max_rows=360000, on_position=None):
+        self.cf = cf
+        self.LogConfig = log_config  # cflib's LogConfig (or the simulator's)
+        self.path = path
+        self.period_ms = period_ms
+        self.flush_s = flush_s
+        self.max_rows = max_rows
+        self.on_position = on_position
+
+        self.buf = np.zeros(capacity, DTYPE)
+        self.count = 0     # rows ever written to buf (row i lives at i % capacity)
+        self.flushed = 0   # rows in the file
+        self._next = 0     # next ring row (in count terms) the flush thread will copy
+        self.dropped = 0   # rows overwritten before the flush thread got to them
+        self._latest = [float("nan")] * len(DTYPE.names)  # NaN until a block first reports
+
+        self.meta = {}  # extra entries for the .json (e.g. startup latencies)
+        self._watchers = []  # [fn, min_dt, next_t]
+        self._blocks = []
+        self._file = None
+        self._stop = False
+        self._wake = threading.Event()  # flush early when the ring is half full
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    # --- consumers ---
+
+    def add_watcher(self, fn, hz=10.0):
+        """Call fn(x, y, z) from the log thread, at most hz times per second of flight time."""
+        self._watchers.append([fn, 1.0 / hz, 0.0])
+
+    def remove_watcher(self, fn):
+        self._watchers = [w for w in self._watchers if w[0] is not fn]
+
+    def latest(self, n=None):
+        """Last n rows (all still in the ring if None), oldest first, as a copy."""
+        count = self.count
+        cap = len(self.buf)
+        n = min(count, cap) if n is None else min(n, count, cap)
+        idx = np.arange(count - n, count) % cap
+        return self.buf[idx]
+
+    # --- log callbacks (cflib thread) ---
+
+    def _on_state(self, timestamp, data, logconf):
+        row = self._latest
+        row[0] = timestamp / 1000.0
+        for var, v in data.items():
+            row[_COLUMN[var]] = v
+
+        cap = len(self.buf)
+        self.buf[self.count % cap] = tuple(row)
+        self.count += 1
+        if self.count - self._next >= cap // 2:
+            self._wake.set()
+
+        x, y, z = row[1], row[2], row[3]
+        if self.on_position is not None:
+            self.on_position(x, y, z)
+        t = row[0]
+        for w in self._watchers:
+            if t >= w[2]:
+                w[2] = t + w[1]
+                w[0](x, y, z)
+
+    def _on_other(self, timestamp, data, logconf):
+        row = self._latest
+        for var, v in data.items():
+            row[_COLUMN[var]] = v
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self.path is not None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = np.memmap(self.path, dtype=DTYPE, mode="w+", shape=(self.max_rows,))
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+        for name, variables in BLOCKS.items():
+            lg = self.LogConfig(name=name, period_in_ms=self.period_ms)
+            for var in variables:
+                lg.add_variable(var, "float")
+            self.cf.log.add_config(lg)
+            lg.data_received_cb.add_callback(self._on_state if name == "state" else self._on_other)
+            lg.start()
+            self._blocks.append(lg)
+
+    def _flush_loop(self):
+        while not self._stop:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Copy rows written since the last flush into the file."""
+        if self._file is None:
+            return
+        with self._flush_lock:
+            cap = len(self.buf)
+            start, end = self._next, self.count
+            if end - start > cap:
+                self.dropped += end - start - cap
+                start = end - cap
+            n = min(end - start, self.max_rows - self.flushed)  # rows past max_rows are not kept
+            self._next = end
+            if n <= 0:
+                return
+
+            out = self._file[self.flushed:self.flushed + n]
+            i0 = start % cap
+            if i0 + n <= cap:
+                out[:] = self.buf[i0:i0 + n]
+            else:
+                k = cap - i0
+                out[:k] = self.buf[i0:]
+                out[k:] = self.buf[:n - k]
+            self.flushed += n
+            self._file.flush()
+
+    def stop(self):
+        """Stop the log blocks, write out what's left, trim the file and write its .json."""
+        for lg in self._blocks:
+            try:
+                lg.stop()
+            except Exception:
+                pass
+        self._blocks = []
+
+        self._stop = True
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        if self._file is None:
+            return
+
+        self.flush()
+        rows = self.flushed
+        self._file = None  # last reference: unmaps, so the file can be trimmed
+        os.truncate(self.path, rows * DTYPE.itemsize)
+        with open(self.path + ".json", "w") as f:
+            json.dump({
+                "dtype": [list(d) for d in DTYPE.descr],
+                "rows": rows,
+                "period_ms": self.period_ms,
+                "dropped": self.dropped,
+                "written": self.count,
+                **self.meta,
+            }, f, indent=1)
+        print(f"[TELEMETRY] {rows} samples -> {self.path}"
+              + (f" ({self.dropped} dropped)" if self.dropped else ""))
+
+
+def new_path(directory=TELEMETRY_DIR):
+    """telemetry/flight_YYYYmmdd_HHMMSS.bin"""
+    return os.path.join(directory, time.strftime("flight_%Y%m%d_%H%M%S.bin"))
+
+
+def load(path):
+    """Recorded flight as a structured array (fields t, x, y, z, vx, ...)."""
+    dtype = DTYPE
+    meta = path + ".json"
+    if os.path.exists(meta):
+        with open(meta) as f:
+            dtype = np.dtype([tuple(d) for d in json.load(f)["dtype"]])
+    return np.fromfile(path, dtype=dtype)
+
+
+def summarize(rec):
+    t = rec["t"]
+    speed = np.hypot(rec["vx"], rec["vy"])
+    vbat = rec["vbat"][np.isfinite(rec["vbat"])]
+    dt = np.diff(t)
+    print(f"{len(rec)} samples over {t[-1] - t[0]:.1f}s "
+          f"(median period {1000 * np.median(dt):.1f} ms, max gap {1000 * dt.max():.0f} ms)")
+    print(f"max xy speed {np.nanmax(speed):.2f} m/s | max |roll|/|pitch| "
+          f"{np.nanmax(np.abs(rec['roll'])):.1f}/{np.nanmax(np.abs(rec['pitch'])):.1f} deg")
+    if len(vbat):
+        print(f"battery {vbat[0]:.2f} -> {vbat[-1]:.2f} V (min {vbat.min():.2f})")
+    print(f"final position variance {rec['varPX'][-1]:.2e} {rec['varPY'][-1]:.2e} {rec['varPZ'][-1]:.2e}")
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Summarize a recorded flight")
+    ap.add_argument("path", nargs="?", help="flight_*.bin (default: newest in telemetry/)")
+    args = ap.parse_args()
+
+    path = args.path
+    if path is None:
+        runs = sorted(f for f in os.listdir(TELEMETRY_DIR) if f.endswith(".bin")) if os.path.isdir(TELEMETRY_DIR) else []
+        if not runs:
+            print(f"No recordings in {TELEMETRY_DIR}/")
+            return 1
+        path = os.path.join(TELEMETRY_DIR, runs[-1])
+
+    rec = load(path)
+    if len(rec) < 2:
+        print(f"{path}: {len(rec)} samples")
+        return 1
+    print(path)
+    meta_path = path + ".json"
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if "link_s" in meta:
+            print(f"startup: link {meta['link_s']:.2f}s, estimator convergence {meta.get('estimator_s')} s")
+    summarize(rec)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,6 @@
-from world import grid, label_to_xy, xy_to_label
+from world import label_to_xy, xy_to_label
 from astar_core import astar
+from plan_cache import cached_plan
 
 # baseline
 def manhattan(p, goal):
@@ -10,7 +11,12 @@ def plan_v1(start_label: str, goal_label: str):
     """
     Classic A*, Manhattan heuristic, no deadline.
     Returns list of labels like ["A1", "A2", "B2", ...] or None if no path.
+    Results are cached per grid state.
     """
+    return cached_plan("v1", start_label, goal_label, lambda snap: _plan_v1(snap, start_label, goal_label))
+
+
+def _plan_v1(grid, start_label: str, goal_label: str):
     start_xy = label_to_xy(start_label)
     goal_xy = label_to_xy(goal_label)
 
@@ -1,5 +1,6 @@
-from world import grid, label_to_xy, xy_to_label
-from astar_core import astar
+from world import label_to_xy, xy_to_label
+from astar_core import astar, arastar
+from plan_cache import cached_plan
 
 # speedy
 def manhattan(p, goal):
@@ -10,7 +11,16 @@ def plan_v2(start_label: str, goal_label: str, deadline_ms: float):
     """
     A* with a time deadline in milliseconds.
     Returns (path_labels, hit_deadline)
+    Complete (non-truncated) results are cached per grid state.
     """
+    return cached_plan(
+        "v2", start_label, goal_label,
+        lambda snap: _plan_v2(snap, start_label, goal_label, deadline_ms),
+        keep=lambda r: not r[1],
+    )
+
+
+def _plan_v2(grid, start_label: str, goal_label: str, deadline_ms: float):
     start_xy = label_to_xy(start_label)
     goal_xy = label_to_xy(goal_label)
 
@@ -21,3 +31,32 @@ def plan_v2(start_label: str, goal_label: str, deadline_ms: float):
 
     path_labels = [xy_to_label(x, y) for (x, y) in path_xy]
     return path_labels, hit_deadline
+
+
+def plan_v2_anytime(start_label: str, goal_label: str, deadline_ms: float, w_start: float = 2.5):
+    """
+    Anytime (ARA*) version of plan_v2: always returns a complete path if one
+    exists, then spends the rest of the deadline tightening it.
+    Returns (path_labels, hit_deadline, bound)
+    Only proven-optimal results (bound == 1) are cached.
+    """
+    return cached_plan(
+        "v2-anytime", start_label, goal_label,
+        lambda snap: _plan_v2_anytime(snap, start_label, goal_label, deadline_ms, w_start),
+        keep=lambda r: r[2] == 1.0,
+    )
+
+
+def _plan_v2_anytime(grid, start_label: str, goal_label: str, deadline_ms: float, w_start: float):
+    start_xy = label_to_xy(start_label)
+    goal_xy = label_to_xy(goal_label)
+
+    path_xy, hit_deadline, bound = arastar(
+        grid, start_xy, goal_xy, manhattan, deadline_ms=deadline_ms, w_start=w_start
+    )
+
+    if path_xy is None:
+        return None, hit_deadline, bound
+
+    path_labels = [xy_to_label(x, y) for (x, y) in path_xy]
+    return path_labels, hit_deadline, bound
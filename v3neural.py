@@ -1,20 +1,182 @@
-from world import grid, label_to_xy, xy_to_label
-from astar_core import astar
+import os
+from array import array
+
+import world
+from world import label_to_xy, xy_to_label
+from astar_core import astar, heuristic_table
+from plan_cache import cached_plan
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except Exception:
+    HAVE_NUMPY = False
+
+WEIGHTS_PATH = "v3_weights.npz"
+N_FEATURES = 5
+
 
 # smarty pants
-def neural_heuristic(p, goal):
-    # TODO: replace this with NN output
+def manhattan(p, goal):
     return abs(p[0] - goal[0]) + abs(p[1] - goal[1])
 
 
+def cell_features(occ, goal_xy):
+    """
+    occ: (rows, cols) uint8 array, 1 = blocked
+    returns: (rows * cols, N_FEATURES) float32, cells in row-major order
+
+    Features are scaled by (rows + cols) so one model works on any arena size:
+      |dx|, |dy|, manhattan, blocked 4-neighbors (/4),
+      blocked fraction of the cell-to-goal bounding box
+    """
+    rows, cols = occ.shape
+    scale = float(rows + cols)
+    gx, gy = goal_xy
+
+    ys, xs = np.mgrid[0:rows, 0:cols]
+    adx = np.abs(xs - gx)
+    ady = np.abs(ys - gy)
+
+    blocked = (occ != 0).astype(np.float32)
+    padded = np.pad(blocked, 1, constant_values=1.0)
+    nbr = padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]
+
+    # integral image -> blocked count in the box spanned by cell and goal
+    ii = np.zeros((rows + 1, cols + 1), dtype=np.float32)
+    ii[1:, 1:] = blocked.cumsum(0).cumsum(1)
+    y0, y1 = np.minimum(ys, gy), np.maximum(ys, gy) + 1
+    x0, x1 = np.minimum(xs, gx), np.maximum(xs, gx) + 1
+    box = ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]
+    box_frac = box / ((y1 - y0) * (x1 - x0))
+
+    feats = np.stack(
+        [adx / scale, ady / scale, (adx + ady) / scale, nbr / 4.0, box_frac],
+        axis=-1,
+    )
+    return feats.reshape(rows * cols, N_FEATURES).astype(np.float32)
+
+
+def mlp_forward(layers, x):
+    """Plain ReLU MLP: layers = [(W, b), ...], linear last layer."""
+    for i, (W, b) in enumerate(layers):
+        x = x @ W + b
+        if i < len(layers) - 1:
+            x = np.maximum(x, 0.0)
+    return x
+
+
+def predict_h(layers, occ, goal_xy):
+    """
+    Heuristic for every cell of occ in one batch: manhattan + predicted detour.
+    returns: (rows, cols) float64 array (blocked cells keep plain Manhattan)
+    """
+    rows, cols = occ.shape
+    gx, gy = goal_xy
+    ys, xs = np.mgrid[0:rows, 0:cols]
+    h = (np.abs(xs - gx) + np.abs(ys - gy)).astype(np.float64)
+
+    free = np.flatnonzero(occ.ravel() == 0)
+    if free.size:
+        feats = cell_features(occ, goal_xy)[free]
+        detour = mlp_forward(layers, feats)[:, 0]
+        h.ravel()[free] += np.maximum(detour, 0.0) * (rows + cols)
+    return h
+
+
+def load_weights(path=WEIGHTS_PATH):
+    """Load [(W, b), ...] from a .npz written by v3train.py (None if missing)."""
+    if not HAVE_NUMPY or not os.path.exists(path):
+        return None
+    data = np.load(path)
+    layers = []
+    i = 0
+    while f"W{i}" in data:
+        layers.append((data[f"W{i}"].astype(np.float32), data[f"b{i}"].astype(np.float32)))
+        i += 1
+    return layers or None
+
+
+class NeuralHeuristic:
+    """
+    Batched MLP heuristic over world snapshots.
+
+    One forward pass covers every free cell for a goal; the table is cached per
+    (goal, grid version). The model predicts the detour on top of Manhattan
+    (scaled by rows + cols), so h = manhattan + detour and never below Manhattan.
+    Without NumPy or weights it is just Manhattan.
+    """
+
+    def __init__(self, weights_path=WEIGHTS_PATH, max_tables=8):
+        self.layers = load_weights(weights_path)
+        self.max_tables = max_tables
+        self._tables = {}
+
+    @property
+    def enabled(self):
+        return self.layers is not None
+
+    def table(self, goal_xy, snap=None):
+        """
+        array('d') of h for every cell, indexed like astar cells (x * rows + y).
+        snap: world snapshot to evaluate on (default: the latest one)
+        """
+        if snap is None:
+            snap = world.snapshot()
+        rows, cols = snap.rows, snap.cols
+        if not self.enabled:
+            return heuristic_table(manhattan, goal_xy, cols, rows)
+
+        key = (goal_xy, snap.version, rows, cols)
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+
+        h = predict_h(self.layers, np.frombuffer(snap.cells, dtype=np.uint8).reshape(rows, cols), goal_xy)
+        table = array("d")
+        table.frombytes(np.ascontiguousarray(h.T, dtype=np.float64).tobytes())
+
+        if len(self._tables) >= self.max_tables:
+            self._tables.pop(next(iter(self._tables)))
+        self._tables[key] = table
+        return table
+
+    def __call__(self, p, goal):
+        if not self.enabled:
+            return manhattan(p, goal)
+        snap = world.snapshot()
+        return self.table(goal, snap)[p[0] * snap.rows + p[1]]
+
+
+# loaded once at startup (falls back to Manhattan without weights)
+backend = NeuralHeuristic()
+
+
+def neural_heuristic(p, goal):
+    return backend(p, goal)
+
+
 def plan_v3(start_label: str, goal_label: str, deadline_ms: float = None):
+    # complete (non-truncated) results are cached per grid state
+    return cached_plan(
+        "v3", start_label, goal_label,
+        lambda snap: _plan_v3(snap, start_label, goal_label, deadline_ms),
+        keep=lambda r: not r[1],
+    )
+
+
+def _plan_v3(grid, start_label: str, goal_label: str, deadline_ms: float = None):
     start_xy = label_to_xy(start_label)
     goal_xy = label_to_xy(goal_label)
 
-    path_xy, hit_deadline = astar(grid, start_xy, goal_xy, neural_heuristic, deadline_ms=deadline_ms)
+    # whole-grid heuristic in one batch, reused until the goal or grid changes
+    h_table = backend.table(goal_xy, grid)
+    path_xy, hit_deadline = astar(
+        grid, start_xy, goal_xy, neural_heuristic, deadline_ms=deadline_ms, h_table=h_table
+    )
 
     if path_xy is None:
         return None, hit_deadline
 
     path_labels = [xy_to_label(x, y) for (x, y) in path_xy]
-    return path_labels, hit_deadline
\ No newline at end of file
+    return path_labels, hit_deadline
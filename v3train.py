@@ -0,0 +1,259 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import world
+from astar_core import astar
+from distance_field import goal_distances
+from v3neural import N_FEATURES, WEIGHTS_PATH, cell_features, load_weights, manhattan, predict_h
+
+# Map sizes as (cols, rows): the GUI board plus bigger arenas
+SIZES = [(len(world.COLS), len(world.ROWS)), (16, 16), (32, 24), (48, 48)]
+
+
+def random_map(rng, cols, rows):
+    """Random blocks plus a few wall segments (1 = blocked)."""
+    occ = (rng.random((rows, cols)) < rng.uniform(0.0, 0.3)).astype(np.uint8)
+    for _ in range(rng.integers(0, max(2, (rows + cols) // 8))):
+        if rng.random() < 0.5:
+            y = rng.integers(rows)
+            x0, x1 = sorted(rng.integers(0, cols, size=2))
+            occ[y, x0:x1 + 1] = 1
+        else:
+            x = rng.integers(cols)
+            y0, y1 = sorted(rng.integers(0, rows, size=2))
+            occ[y0:y1 + 1, x] = 1
+    return occ
+
+
+def label_map(occ, goal_xy):
+    """Features + target (detour over Manhattan, scaled like the features) for reachable free cells."""
+    rows, cols = occ.shape
+    dist = np.frombuffer(goal_distances(occ, goal_xy), dtype=np.float64).reshape(rows, cols)
+
+    gx, gy = goal_xy
+    ys, xs = np.mgrid[0:rows, 0:cols]
+    man = np.abs(xs - gx) + np.abs(ys - gy)
+
+    keep = np.flatnonzero(np.isfinite(dist).ravel())
+    feats = cell_features(occ, goal_xy)[keep]
+    target = ((dist - man) / float(rows + cols)).ravel()[keep]
+    return feats, target.astype(np.float32)
+
+
+def make_shard(args):
+    """Worker: generate one shard and write it straight to <out>/shard_NNNN_{x,y}.npy."""
+    shard, seed, out_dir, maps, goals_per_map, cells_per_goal = args
+    rng = np.random.default_rng(seed)
+
+    xs, ys = [], []
+    for _ in range(maps):
+        cols, rows = SIZES[rng.integers(len(SIZES))]
+        occ = random_map(rng, cols, rows)
+        free = np.argwhere(occ == 0)
+        if len(free) == 0:
+            continue
+        for gy, gx in free[rng.integers(len(free), size=goals_per_map)]:
+            f, t = label_map(occ, (int(gx), int(gy)))
+            if len(t) > cells_per_goal:
+                pick = rng.choice(len(t), size=cells_per_goal, replace=False)
+                f, t = f[pick], t[pick]
+            xs.append(f)
+            ys.append(t)
+
+    X = np.concatenate(xs) if xs else np.zeros((0, N_FEATURES), np.float32)
+    Y = np.concatenate(ys) if ys else np.zeros((0,), np.float32)
+
+    base = os.path.join(out_dir, f"shard_{shard:04d}")
+    mx = np.lib.format.open_memmap(base + "_x.npy", mode="w+", dtype=np.float16, shape=X.shape)
+    my = np.lib.format.open_memmap(base + "_y.npy", mode="w+", dtype=np.float32, shape=Y.shape)
+    mx[:] = X
+    my[:] = Y
+    mx.flush()
+    my.flush()
+    return len(Y)
+
+
+def generate(out_dir, shards, workers, maps, goals_per_map, cells_per_goal, seed):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(i, seed + i, out_dir, maps, goals_per_map, cells_per_goal) for i in range(shards)]
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        total = sum(pool.map(make_shard, jobs))
+    print(f"[GEN] {shards} shards, {total} samples in {time.perf_counter() - t0:.1f}s -> {out_dir}")
+
+
+def load_shards(data_dir):
+    """Memory-map every shard (nothing is read until batches are drawn)."""
+    out = []
+    for fx in sorted(glob.glob(os.path.join(data_dir, "shard_*_x.npy"))):
+        X = np.load(fx, mmap_mode="r")
+        Y = np.load(fx[:-6] + "_y.npy", mmap_mode="r")
+        if len(Y):
+            out.append((X, Y))
+    if not out:
+        raise RuntimeError(f"No shards in {data_dir} (run: python v3train.py gen)")
+    return out
+
+
+def init_layers(rng, sizes):
+    layers = []
+    for n_in, n_out in zip(sizes, sizes[1:]):
+        W = (rng.standard_normal((n_in, n_out)) * np.sqrt(2.0 / n_in)).astype(np.float32)
+        layers.append([W, np.zeros(n_out, np.float32)])
+    return layers
+
+
+def train(data_dir, out_path, hidden, epochs, batch, lr, seed):
+    """Minibatch Adam on MSE, NumPy only."""
+    rng = np.random.default_rng(seed)
+    shards = load_shards(data_dir)
+    sizes = np.array([len(Y) for _, Y in shards], dtype=np.float64)
+    total = int(sizes.sum())
+
+    layers = init_layers(rng, [N_FEATURES] + list(hidden) + [1])
+    m = [[np.zeros_like(p) for p in layer] for layer in layers]
+    v = [[np.zeros_like(p) for p in layer] for layer in layers]
+    b1, b2, eps = 0.9, 0.999, 1e-8
+    step = 0
+
+    steps_per_epoch = max(1, total // batch)
+    print(f"[TRAIN] {total} samples in {len(shards)} shards, {steps_per_epoch} steps/epoch")
+
+    for epoch in range(epochs):
+        t0 = time.perf_counter()
+        loss_sum = 0.0
+        for _ in range(steps_per_epoch):
+            # draw from one shard at a time so reads stay local in the memmap
+            X, Y = shards[rng.choice(len(shards), p=sizes / sizes.sum())]
+            idx = np.sort(rng.integers(0, len(Y), size=batch))
+            x = np.asarray(X[idx], dtype=np.float32)
+            y = np.asarray(Y[idx], dtype=np.float32)[:, None]
+
+            # forward, keeping activations
+            acts = [x]
+            for i, (W, b) in enumerate(layers):
+                z = acts[-1] @ W + b
+                acts.append(np.maximum(z, 0.0) if i < len(layers) - 1 else z)
+
+            err = acts[-1] - y
+            loss_sum += float((err ** 2).mean())
+
+            # backward
+            grad = 2.0 * err / len(y)
+            step += 1
+            for i in range(len(layers) - 1, -1, -1):
+                W, b = layers[i]
+                gW = acts[i].T @ grad
+                gb = grad.sum(axis=0)
+                if i > 0:
+                    grad = (grad @ W.T) * (acts[i] > 0)
+                for j, g in enumerate((gW, gb)):
+                    m[i][j] = b1 * m[i][j] + (1 - b1) * g
+                    v[i][j] = b2 * v[i][j] + (1 - b2) * g * g
+                    mh = m[i][j] / (1 - b1 ** step)
+                    vh = v[i][j] / (1 - b2 ** step)
+                    layers[i][j] -= (lr * mh / (np.sqrt(vh) + eps)).astype(np.float32)
+
+        print(f"[TRAIN] epoch {epoch + 1}/{epochs} loss={loss_sum / steps_per_epoch:.6f} "
+              f"({time.perf_counter() - t0:.1f}s)")
+
+    weights = {}
+    for i, (W, b) in enumerate(layers):
+        weights[f"W{i}"] = W
+        weights[f"b{i}"] = b
+    np.savez(out_path, **weights)
+    print(f"[TRAIN] saved {out_path}")
+    return [(W, b) for W, b in layers]
+
+
+def evaluate(layers, queries, seed):
+    """
+    Headline metric: nodes expanded by A* with the learned table vs Manhattan,
+    on fresh maps. Also reports path-length excess (the model isn't admissible).
+    """
+    rng = np.random.default_rng(seed)
+    exp_man = exp_nn = 0
+    len_man = len_nn = 0
+    done = 0
+
+    while done < queries:
+        cols, rows = SIZES[rng.integers(len(SIZES))]
+        occ = random_map(rng, cols, rows)
+        free = np.argwhere(occ == 0)
+        if len(free) < 2:
+            continue
+        (sy, sx), (gy, gx) = free[rng.choice(len(free), size=2, replace=False)]
+        start, goal = (int(sx), int(sy)), (int(gx), int(gy))
+
+        s_man, s_nn = {}, {}
+        p_man, _ = astar(occ, start, goal, manhattan, stats=s_man)
+        if p_man is None:
+            continue
+        table = np.ascontiguousarray(predict_h(layers, occ, goal).T).ravel()
+        p_nn, _ = astar(occ, start, goal, manhattan, h_table=table.tolist(), stats=s_nn)
+
+        exp_man += s_man["expanded"]
+        exp_nn += s_nn["expanded"]
+        len_man += len(p_man)
+        len_nn += len(p_nn)
+        done += 1
+
+    reduction = 100.0 * (1.0 - exp_nn / max(1, exp_man))
+    print(f"[EVAL] {done} queries | expanded: manhattan={exp_man} learned={exp_nn} "
+          f"| node-expansion reduction: {reduction:.1f}% "
+          f"| path length excess: {100.0 * (len_nn / len_man - 1.0):.2f}%")
+    return reduction
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dataset generation / training for the v3 heuristic")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    g = sub.add_parser("gen", help="generate labelled shards with a process pool")
+    g.add_argument("--out", default="v3_data")
+    g.add_argument("--shards", type=int, default=32)
+    g.add_argument("--workers", type=int, default=os.cpu_count())
+    g.add_argument("--maps", type=int, default=50, help="maps per shard")
+    g.add_argument("--goals", type=int, default=4, help="goals per map")
+    g.add_argument("--cells", type=int, default=256, help="max samples per goal")
+    g.add_argument("--seed", type=int, default=0)
+
+    t = sub.add_parser("train", help="train the MLP and write the weights file")
+    t.add_argument("--data", default="v3_data")
+    t.add_argument("--out", default=WEIGHTS_PATH)
+    t.add_argument("--hidden", type=int, nargs="+", default=[32, 32])
+    t.add_argument("--epochs", type=int, default=10)
+    t.add_argument("--batch", type=int, default=512)
+    t.add_argument("--lr", type=float, default=1e-3)
+    t.add_argument("--seed", type=int, default=0)
+    t.add_argument("--eval", type=int, default=200, help="eval queries after training (0 = skip)")
+
+    e = sub.add_parser("eval", help="report node-expansion reduction vs Manhattan")
+    e.add_argument("--weights", default=WEIGHTS_PATH)
+    e.add_argument("--queries", type=int, default=200)
+    e.add_argument("--seed", type=int, default=12345)
+
+    args = ap.parse_args()
+
+    if args.cmd == "gen":
+        generate(args.out, args.shards, args.workers, args.maps, args.goals, args.cells, args.seed)
+    elif args.cmd == "train":
+        layers = train(args.data, args.out, args.hidden, args.epochs, args.batch, args.lr, args.seed)
+        if args.eval:
+            evaluate(layers, args.eval, args.seed + 1)
+    else:
+        layers = load_weights(args.weights)
+        if layers is None:
+            print(f"No weights at {args.weights}")
+            return 1
+        evaluate(layers, args.queries, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
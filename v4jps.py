@@ -0,0 +1,33 @@
+from world import label_to_xy, xy_to_label
+from astar_core import jump_point_search
+from plan_cache import cached_plan
+
+# jumpy
+def manhattan(p, goal):
+    return abs(p[0] - goal[0]) + abs(p[1] - goal[1])
+
+
+def plan_v4(start_label: str, goal_label: str, deadline_ms: float = None):
+    """
+    Jump Point Search (4-dir, every step cost 1), optional deadline in milliseconds.
+    Returns (path_labels, hit_deadline); path is expanded back to unit steps.
+    Complete (non-truncated) results are cached per grid state.
+    """
+    return cached_plan(
+        "v4", start_label, goal_label,
+        lambda snap: _plan_v4(snap, start_label, goal_label, deadline_ms),
+        keep=lambda r: not r[1],
+    )
+
+
+def _plan_v4(grid, start_label: str, goal_label: str, deadline_ms: float = None):
+    start_xy = label_to_xy(start_label)
+    goal_xy = label_to_xy(goal_label)
+
+    path_xy, hit_deadline = jump_point_search(grid, start_xy, goal_xy, manhattan, deadline_ms=deadline_ms)
+
+    if path_xy is None:
+        return None, hit_deadline
+
+    path_labels = [xy_to_label(x, y) for (x, y) in path_xy]
+    return path_labels, hit_deadline
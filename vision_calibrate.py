@@ -1,9 +1,14 @@
+import argparse
 import cv2
 import numpy as np
 import os
 
+import world
+from vision_motion_to_world import CELL_PX, INTRINSICS_PATH, load_intrinsics, load_warp_maps
+
 CAM_INDEX = 0
 WARP_W, WARP_H = 640, 480
+BOARD = (9, 6)  # inner corners of the chessboard used for --intrinsics
 pts = []
 
 
@@ -24,12 +29,71 @@ def mouse(event, x, y, flags, param):
         pts.append([x, y])
 
 
+def calibrate_intrinsics(cap, board=BOARD, min_views=12):
+    """
+    Lens calibration from chessboard views: Space grabs a view (board found),
+    Enter solves and writes camera_intrinsics.npz (K, dist).
+    Move the board around the whole image, corners included.
+    """
+    objp = np.zeros((board[0] * board[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:board[0], 0:board[1]].T.reshape(-1, 2)
+    obj_pts, img_pts = [], []
+    size = None
+
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            return 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        size = gray.shape[::-1]
+        found, corners = cv2.findChessboardCorners(gray, board, flags=cv2.CALIB_CB_FAST_CHECK)
+
+        vis = frame.copy()
+        if found:
+            cv2.drawChessboardCorners(vis, board, corners, found)
+        cv2.putText(vis, f"{len(obj_pts)}/{min_views} views | Space=grab | Enter=solve | q=quit",
+                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.imshow("intrinsics", vis)
+        k = cv2.waitKey(1) & 0xFF
+
+        if k in (ord('q'), 27):
+            return 1
+        if k == ord(' ') and found:
+            corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1),
+                                       (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 1e-3))
+            obj_pts.append(objp)
+            img_pts.append(corners)
+        if k in (13, 10):
+            if len(obj_pts) < min_views:
+                print(f"Need {min_views} views, have {len(obj_pts)}")
+                continue
+            rms, K, dist, _, _ = cv2.calibrateCamera(obj_pts, img_pts, size, None, None)
+            np.savez(INTRINSICS_PATH, K=K, dist=dist, rms=rms, size=np.array(size))
+            print(f"Saved {INTRINSICS_PATH} (reprojection error {rms:.3f} px)")
+            print("Re-run vision_calibrate.py to redo H.npy on the undistorted image")
+            return 0
+
+
 def main():
+    ap = argparse.ArgumentParser(description="Floor homography (H.npy) / lens calibration")
+    ap.add_argument("--intrinsics", action="store_true", help="chessboard lens calibration first")
+    args = ap.parse_args()
+
     cap = cv2.VideoCapture(CAM_INDEX)
     if not cap.isOpened():
         print("Could not open camera")
         return 1
 
+    if args.intrinsics:
+        rc = calibrate_intrinsics(cap)
+        cap.release()
+        cv2.destroyAllWindows()
+        return rc
+
+    # With intrinsics, corners are clicked on the undistorted image, so H maps
+    # undistorted pixels (what vision_motion_to_world's remap expects)
+    intrinsics = load_intrinsics()
+
     cv2.namedWindow("calibrate")
     cv2.setMouseCallback("calibrate", mouse)
 
@@ -39,6 +103,8 @@ def main():
         ok, frame = cap.read()
         if not ok:
             break
+        if intrinsics is not None:
+            frame = cv2.undistort(frame, *intrinsics)
 
         vis = frame.copy()
         for i, p in enumerate(pts):
@@ -81,6 +147,8 @@ def main():
             else:
                 np.save("H.npy", H)
                 print("Saved H.npy")
+                # build the vision remap table now (same warp size as VisionObstacleUpdater)
+                load_warp_maps(H, (len(world.ROWS) * CELL_PX, len(world.COLS) * CELL_PX), intrinsics)
                 break
 
     cap.release()
@@ -1,5 +1,7 @@
 import cv2
+import hashlib
 import numpy as np
+import threading
 import time
 import os
 import world
@@ -8,6 +10,65 @@ import world
 # Grid-aligned warp dimensions: cellPx * grid size
 CELL_PX = 80
 
+INTRINSICS_PATH = "camera_intrinsics.npz"  # K, dist from vision_calibrate.py --intrinsics
+WARP_MAP_PATH = "warp_map.npz"             # cached remap tables, next to H.npy
+
+
+def load_intrinsics(path=INTRINSICS_PATH):
+    """(K, dist) from the chessboard calibration, or None (no undistortion)."""
+    if not os.path.exists(path):
+        return None
+    d = np.load(path)
+    return d["K"], d["dist"]
+
+
+def build_warp_maps(H, size, intrinsics=None):
+    """
+    Undistortion + floor homography as one cv2.remap lookup: for every warp
+    pixel, where to sample the raw camera frame. H maps (undistorted) camera
+    pixels to the warp, like warpPerspective. size = (w, h) of the warp.
+    returns: fixed-point maps (CV_16SC2 coords + interpolation table)
+    """
+    w, h = size
+    us, vs = np.meshgrid(np.arange(w, dtype=np.float64), np.arange(h, dtype=np.float64))
+    pts = np.stack([us.ravel(), vs.ravel(), np.ones(w * h)])
+    src = np.linalg.inv(H) @ pts
+    src = src[:2] / src[2]
+
+    if intrinsics is not None:
+        # undistorted pixel -> camera ray (z = 1) -> where the lens actually put it
+        K, dist = intrinsics
+        rays = np.linalg.inv(K) @ np.vstack([src, np.ones(w * h)])
+        img, _ = cv2.projectPoints(np.ascontiguousarray(rays.T.reshape(-1, 1, 3)),
+                                   np.zeros(3), np.zeros(3), K, dist)
+        src = img.reshape(-1, 2).T
+
+    map_x = src[0].reshape(h, w).astype(np.float32)
+    map_y = src[1].reshape(h, w).astype(np.float32)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+def load_warp_maps(H, size, intrinsics=None, path=WARP_MAP_PATH):
+    """build_warp_maps(), cached on disk; rebuilt when H, size or the intrinsics change."""
+    fp = hashlib.sha1(np.ascontiguousarray(H, dtype=np.float64).tobytes() + repr(tuple(size)).encode())
+    if intrinsics is not None:
+        for a in intrinsics:
+            fp.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    fp = fp.hexdigest()
+
+    if os.path.exists(path):
+        try:
+            d = np.load(path)
+            if str(d["fingerprint"]) == fp:
+                return d["map1"], d["map2"]
+        except Exception as e:
+            print(f"[VISION] ignoring unreadable {path}: {e}")
+
+    map1, map2 = build_warp_maps(H, size, intrinsics)
+    np.savez(path, map1=map1, map2=map2, fingerprint=fp)
+    print(f"[VISION] built warp map {size[0]}x{size[1]} -> {path}")
+    return map1, map2
+
 
 def draw_grid_overlay(img, rows, cols, color=(0, 255, 0), thickness=1):
     """Draw grid lines on an image. Modifies img in-place and returns it."""
@@ -40,24 +101,91 @@ def draw_blocked_overlay(img, blocked, rows, cols, color=(0, 0, 255), alpha=0.4)
     cell_h = h / rows
 
     overlay = img.copy()
-    for gy in range(rows):
-        for gx in range(cols):
-            if blocked[gy, gx]:
-                x0 = int(gx * cell_w)
-                y0 = int(gy * cell_h)
-                x1 = int((gx + 1) * cell_w)
-                y1 = int((gy + 1) * cell_h)
-                cv2.rectangle(overlay, (x0, y0), (x1, y1), color, -1)
+    for gy, gx in np.argwhere(blocked):
+        x0 = int(gx * cell_w)
+        y0 = int(gy * cell_h)
+        x1 = int((gx + 1) * cell_w)
+        y1 = int((gy + 1) * cell_h)
+        cv2.rectangle(overlay, (x0, y0), (x1, y1), color, -1)
 
     cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
     return img
 
 
+class LatestFrameCapture:
+    """
+    Reads the camera on its own thread and keeps only the newest frame, so the
+    driver queue never builds up and step() always sees the present.
+
+    read() waits for a frame newer than the last one it returned:
+    (ok, frame, stamp), stamp = time.perf_counter() when the frame came off the camera.
+    Once the camera gave up (stopped), read() returns not-ok right away.
+    dropped counts frames overwritten before anyone read them.
+    """
+
+    def __init__(self, cam_index=0):
+        self.cap = cv2.VideoCapture(cam_index)
+        if not self.cap.isOpened():
+            raise RuntimeError("Could not open camera")
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # not every backend honors it; the thread is what matters
+
+        self._cond = threading.Condition()
+        self.frame = None
+        self.stamp = 0.0
+        self.seq = 0        # frames captured
+        self._read_seq = 0  # seq of the last frame handed out by read()
+        self.dropped = 0
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        fails = 0
+        while not self._stopped:
+            ok, frame = self.cap.read()
+            stamp = time.perf_counter()
+            if not ok:
+                fails += 1
+                if fails > 50:
+                    print("[VISION] camera stopped delivering frames")
+                    break
+                time.sleep(0.01)
+                continue
+            fails = 0
+            with self._cond:
+                if self.seq > self._read_seq:
+                    self.dropped += 1
+                self.frame, self.stamp = frame, stamp
+                self.seq += 1
+                self._cond.notify_all()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def read(self, timeout=1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > self._read_seq or self._stopped, timeout)
+            if self.seq == self._read_seq:
+                return False, None, 0.0
+            self._read_seq = self.seq
+            return True, self.frame, self.stamp
+
+    def release(self):
+        self._stopped = True
+        self._thread.join(timeout=1.0)
+        self.cap.release()
+
+
 class VisionObstacleUpdater:
     def __init__(
         self,
         cam_index=0,
-        hit_frac=0.18,
+        hit_frac=0.4,
         hit_frames=3,
         hold_ms=600,
         history=300,
@@ -67,9 +195,11 @@ class VisionObstacleUpdater:
         if not os.path.exists("H.npy"):
             raise RuntimeError("Missing H.npy (run vision_calibrate.py)")
 
-        self.cap = cv2.VideoCapture(cam_index)
-        if not self.cap.isOpened():
-            raise RuntimeError("Could not open camera")
+        self.capture = LatestFrameCapture(cam_index)
+
+        # capture -> world update latency of the last frame, and a running average (ms)
+        self.latency_ms = 0.0
+        self.latency_avg_ms = 0.0
 
         self.grid_w = len(world.COLS)
         self.grid_h = len(world.ROWS)
@@ -79,6 +209,21 @@ class VisionObstacleUpdater:
         self.warp_h = self.grid_w * CELL_PX
 
         self.H = np.load("H.npy")
+        # H is in undistorted pixels when camera_intrinsics.npz existed at calibration time
+        self.intrinsics = load_intrinsics()
+        self._map1, self._map2 = load_warp_maps(self.H, (self.warp_w, self.warp_h), self.intrinsics)
+
+        # Debug display is grid_w rows x grid_h cols with (0,0) at top-right;
+        # the GUI grid is grid_h rows x grid_w cols with A1 at top-left:
+        #   gui_row = (grid_h - 1) - disp_col, gui_col = disp_row
+        # i.e. gui = disp.T[::-1]. As flat index tables, so each frame is one gather:
+        #   blocked.ravel() = disp.ravel()[_gui_from_disp], disp = blocked.ravel()[_disp_from_gui]
+        disp_index = np.arange(self.grid_w * self.grid_h).reshape(self.grid_w, self.grid_h)
+        self._gui_from_disp = disp_index.T[::-1].ravel()
+        self._disp_from_gui = np.argsort(self._gui_from_disp)
+        # label of every GUI cell, in blocked.ravel() order (y * grid_w + x)
+        self._labels = [world.xy_to_label(x, y) for y in range(self.grid_h) for x in range(self.grid_w)]
+        self._cell_bounds = None  # (shape, ys0, ys1, xs0, xs1, area) for the integral image
 
         self.hit_frac = float(hit_frac)
         self.hit_frames = int(hit_frames)
@@ -91,8 +236,11 @@ class VisionObstacleUpdater:
             detectShadows=False
         )
 
+        # Per-cell hysteresis (GUI orientation): a cell turns blocked after hit_frames
+        # consecutive frames with >= hit_frac foreground and stays blocked until
+        # hold_ms after its last such frame, so one-frame flickers never reach the world
         self.hit_streak = np.zeros((self.grid_h, self.grid_w), dtype=np.uint8)
-        self.hold_until = np.zeros((self.grid_h, self.grid_w), dtype=np.float32)
+        self.hold_until = np.zeros((self.grid_h, self.grid_w), dtype=np.float64)  # perf_counter ms
         self.prev_blocked = np.zeros((self.grid_h, self.grid_w), dtype=bool)
         self._blocked_any = False
 
@@ -104,7 +252,7 @@ class VisionObstacleUpdater:
         self._frame_count = 0
 
     def _warp(self, frame):
-        return cv2.warpPerspective(frame, self.H, (self.warp_w, self.warp_h))
+        return cv2.remap(frame, self._map1, self._map2, cv2.INTER_LINEAR)
 
     def _fgmask(self, warped):
         lr = 0 if (self.freeze_bg_when_blocked and self._blocked_any) else -1
@@ -116,39 +264,39 @@ class VisionObstacleUpdater:
         m = cv2.morphologyEx(m, cv2.MORPH_DILATE, k, iterations=1)
         return m
 
-    def _mask_to_blocked(self, fg):
-        H, W = fg.shape
-        # Warp is swapped: W corresponds to grid_h (7), H corresponds to grid_w (4)
-        cw, ch = W / self.grid_h, H / self.grid_w
-
-        blocked = np.zeros((self.grid_h, self.grid_w), dtype=bool)
-
+    def _cell_box(self, shape):
+        """Pixel bounds of every display cell for a mask of this shape (cached)."""
+        if self._cell_bounds is None or self._cell_bounds[0] != shape:
+            H, W = shape
+            # Warp is swapped: W corresponds to grid_h (7), H corresponds to grid_w (4)
+            ys = (np.arange(self.grid_w + 1) * (H / self.grid_w)).astype(np.intp)
+            xs = (np.arange(self.grid_h + 1) * (W / self.grid_h)).astype(np.intp)
+            area = np.outer(ys[1:] - ys[:-1], xs[1:] - xs[:-1]).astype(np.float64)
+            self._cell_bounds = (shape, ys[:-1, None], ys[1:, None], xs[None, :-1], xs[None, 1:], area)
+        return self._cell_bounds
+
+    def _mask_to_blocked(self, fg, now_ms=None):
         # Don't detect obstacles during warmup (let background model learn)
         self._frame_count += 1
         if self._frame_count < self._warmup_frames:
             self._blocked_any = False
-            return blocked
-
-        # Iterate in display order (rows=grid_w, cols=grid_h)
-        # Debug display: 7 cols (x) × 4 rows (y), with (0,0) at top-right
-        # GUI: 4 cols (A-D) × 7 rows (1-7), with A1 at top-left
-        # Mapping: debug_col -> GUI_row, debug_row -> GUI_col (reversed)
-        for disp_row in range(self.grid_w):  # 4 rows in display (0-3)
-            y0, y1 = int(disp_row * ch), int((disp_row + 1) * ch)
-            for disp_col in range(self.grid_h):  # 7 cols in display (0-6)
-                x0, x1 = int(disp_col * cw), int((disp_col + 1) * cw)
-                cell = fg[y0:y1, x0:x1]
-                frac = (cell > 0).mean()
-
-                # 50% threshold: if half or more of the cell is white, it's blocked
-                if frac >= 0.4:
-                    # Debug (0,0) is top-right, GUI (0,0) is top-left
-                    # Debug col 0 is rightmost, col 6 is leftmost
-                    # GUI row 0 is top, row 6 is bottom
-                    # So: debug col 6 (left) -> GUI row 0 (top), debug col 0 (right) -> GUI row 6 (bottom)
-                    gui_row = (self.grid_h - 1) - disp_col  # flip: debug left -> GUI top
-                    gui_col = disp_row  # debug row 0 (top) -> GUI col 0 (A, leftmost)
-                    blocked[gui_row, gui_col] = True
+            return np.zeros((self.grid_h, self.grid_w), dtype=bool)
+
+        # Fraction of foreground pixels per display cell, all cells at once:
+        # integral image, then four lookups per cell
+        _, y0, y1, x0, x1, area = self._cell_box(fg.shape)
+        ii = cv2.integral((fg > 0).view(np.uint8))
+        hits = ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]
+        # hit: at least hit_frac of the cell is foreground this frame
+        disp_hit = hits >= self.hit_frac * area
+        hit = disp_hit.ravel()[self._gui_from_disp].reshape(self.grid_h, self.grid_w)
+
+        if now_ms is None:
+            now_ms = time.perf_counter() * 1000.0
+        self.hit_streak = np.where(hit, np.minimum(self.hit_streak, 254) + 1, 0).astype(np.uint8)
+        confirmed = self.hit_streak >= self.hit_frames
+        self.hold_until[confirmed] = now_ms + self.hold_ms
+        blocked = confirmed | (self.hold_until > now_ms)
 
         self._blocked_any = bool(blocked.any())
         return blocked
@@ -165,34 +313,28 @@ class VisionObstacleUpdater:
 
     def step(self, start_label, goal_label, drone_label=None, debug=False):
         """
-        Updates world.grid based on camera motion.
+        Updates world.grid based on camera motion, from the newest frame
+        (waits for one if the last was already processed).
         Returns (added_labels, removed_labels).
+        Raises RuntimeError once the camera stopped delivering frames.
         """
-        ok, frame = self.cap.read()
+        ok, frame, stamp = self.capture.read()
         if not ok:
+            if self.capture.stopped:
+                raise RuntimeError("camera stopped")
             return set(), set()
 
         warped = self._warp(frame)
         fg = self._fgmask(warped)
-        blocked = self._mask_to_blocked(fg)
+        blocked = self._mask_to_blocked(fg, now_ms=stamp * 1000.0)
 
         if debug:
             # Draw grid + blocked overlay on both debug windows
-            # Debug display: 7 cols x 4 rows, (0,0) at top-right
-            # blocked[gui_row, gui_col] needs to map to debug display
-            # debug_display[disp_row, disp_col] where disp_col=gui_row, disp_row=(3-gui_col)
+            # Debug display: 7 cols x 4 rows, (0,0) at top-right (see __init__ for the mapping)
             debug_rows = self.grid_w  # 4
             debug_cols = self.grid_h  # 7
             
-            # Create debug blocked array with correct mapping
-            # Reverse of: gui_row = (grid_h-1) - disp_col, gui_col = disp_row
-            blocked_debug = np.zeros((debug_rows, debug_cols), dtype=bool)
-            for gui_row in range(self.grid_h):
-                for gui_col in range(self.grid_w):
-                    if blocked[gui_row, gui_col]:
-                        disp_row = gui_col
-                        disp_col = (self.grid_h - 1) - gui_row
-                        blocked_debug[disp_row, disp_col] = True
+            blocked_debug = blocked.ravel()[self._disp_from_gui].reshape(debug_rows, debug_cols)
 
             warped_debug = warped.copy()
             draw_blocked_overlay(warped_debug, blocked_debug, debug_rows, debug_cols)
@@ -211,29 +353,19 @@ class VisionObstacleUpdater:
         if drone_label is not None:
             ignore |= self._neighbors4_labels(drone_label)
 
-        # Build new dynamic cells set
-        # blocked[gui_row, gui_col] where gui_row=0-6, gui_col=0-3
-        # xy_to_label(x, y) where x=col (0-3), y=row (0-6)
-        new_dynamic_cells = set()
-        for gui_row in range(self.grid_h):  # rows 0-6
-            for gui_col in range(self.grid_w):  # cols 0-3
-                if blocked[gui_row, gui_col]:
-                    lbl = world.xy_to_label(gui_col, gui_row)
-                    if lbl not in ignore:
-                        new_dynamic_cells.add(lbl)
-
-        # Clear old dynamic cells (only if they're not static walls)
-        for lbl in self.prev_dynamic_cells:
-            if lbl not in new_dynamic_cells:
-                x, y = world.label_to_xy(lbl)
-                # Only clear if it was set by us (check if currently blocked)
-                if world.grid[y][x] == 1:
-                    world.clear_obstacle(lbl)
-
-        # Set new dynamic cells
-        for lbl in new_dynamic_cells:
-            if lbl not in self.prev_dynamic_cells:
-                world.set_obstacle(lbl)
+        # Build new dynamic cells set (blocked[gui_row, gui_col], labels in the same order)
+        labels = self._labels
+        new_dynamic_cells = {labels[i] for i in np.flatnonzero(blocked)} - ignore
+
+        # Clear old dynamic cells, set new ones: one batch, one version bump
+        # (cells already at the target value are skipped by apply_changes)
+        updates = {lbl: 0 for lbl in self.prev_dynamic_cells - new_dynamic_cells}
+        updates.update((lbl, 1) for lbl in new_dynamic_cells - self.prev_dynamic_cells)
+        if updates:
+            world.apply_changes(updates)
+
+        self.latency_ms = (time.perf_counter() - stamp) * 1000.0
+        self.latency_avg_ms += 0.05 * (self.latency_ms - self.latency_avg_ms)
 
         # Compute added/removed for caller
         added = new_dynamic_cells - self.prev_dynamic_cells
@@ -245,7 +377,7 @@ class VisionObstacleUpdater:
 
     def close(self):
         try:
-            self.cap.release()
+            self.capture.release()
         except Exception:
             pass
         try:
@@ -1,21 +1,283 @@
-COLS = ["A", "B", "C", "D"]
-ROWS = list(range(1, 8))  # 1..7
+import random
+import string
+import threading
+from collections import namedtuple
 
-# grid[y][x], y = row index (0..11), x = col index (0..3)
-# 0 = free, 1 = obstacle
-grid = [[0 for _ in COLS] for _ in ROWS]
 # wrld
 
+# What subscribers get per flipped cell. cell = (x, y); version is the world version the
+# change produced (a bulk apply_changes() gives every entry in the batch the same version)
+Change = namedtuple("Change", "cell old new version")
+
+
+def col_label(i: int) -> str:
+    """0 -> "A", 25 -> "Z", 26 -> "AA", 27 -> "AB" (spreadsheet-style)."""
+    out = ""
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        out = string.ascii_uppercase[r] + out
+    return out
+
+
+class Snapshot:
+    """
+    Immutable copy of the grid at one version: what planners should read.
+    Same read interface as the live grid (snap[y][x], len(snap), .cells, .cols, .rows),
+    plus the version and grid_hash it was taken at, so it never changes under a search.
+    """
+
+    __slots__ = ("cells", "cols", "rows", "version", "grid_hash", "_row_views")
+
+    def __init__(self, cells: bytes, cols: int, rows: int, version: int, grid_hash: int):
+        self.cells = cells
+        self.cols = cols
+        self.rows = rows
+        self.version = version
+        self.grid_hash = grid_hash
+        view = memoryview(cells)
+        self._row_views = [view[y * cols:(y + 1) * cols] for y in range(rows)]
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, y):
+        return self._row_views[y]
+
+
+class OccupancyGrid:
+    """
+    Occupancy grid backed by one bytearray (0 = free, 1 = obstacle).
+    Cell (x, y) lives at cells[y * cols + x]; labels are column letters + row
+    number ("A1", "D7", "AB12") and convert both ways with a table lookup.
+
+    grid[y][x] still works for readers (read-only row views); writes go through
+    set()/apply_changes()/reset() so version, grid_hash and subscribers stay in sync.
+
+    Writers are serialized by a lock and publish a new Snapshot at the end of every
+    batch (one attribute swap), so snapshot() is lock-free and never sees a
+    half-applied batch. Planners running off-thread should search a snapshot,
+    not the live grid.
+    """
+
+    def __init__(self, cols: int = 4, rows: int = 7):
+        self._write_lock = threading.RLock()  # re-entrant: subscribers may write back
+        self.col_labels = []   # kept as the same list object across resize (world.COLS)
+        self.row_numbers = []  # same (world.ROWS)
+        self.version = 0
+        self.grid_hash = 0
+        self._subscribers = []
+        self.resize(cols, rows)
+
+    def resize(self, cols: int, rows: int):
+        """Change dimensions; clears every cell."""
+        with self._write_lock:
+            self._resize(int(cols), int(rows))
+
+    def _resize(self, cols, rows):
+        self.cols, self.rows = cols, rows
+        n = self.cols * self.rows
+
+        # new buffer rather than an in-place resize (old row views may still be exported)
+        self.cells = bytearray(n)
+        view = memoryview(self.cells)
+        self._row_views = [view[y * self.cols:(y + 1) * self.cols].toreadonly() for y in range(self.rows)]
+
+        self.col_labels[:] = [col_label(i) for i in range(self.cols)]
+        self.row_numbers[:] = range(1, self.rows + 1)
+        self._labels = [f"{c}{y + 1}" for y in range(self.rows) for c in self.col_labels]
+        self._label_index = {lbl: i for i, lbl in enumerate(self._labels)}
+        self._col_index = {c: i for i, c in enumerate(self.col_labels)}
+
+        # Zobrist keys per cell, plus a per-size base so equal patterns on
+        # different arena sizes never share a hash
+        rng = random.Random(f"{self.cols}x{self.rows}")
+        self._zobrist_base = rng.getrandbits(64)
+        self._zobrist = [rng.getrandbits(64) for _ in range(n)]
+        self._reset_done()
+
+    # --- grid[y][x] compatibility ---
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, y):
+        return self._row_views[y]
+
+    # --- labels ---
+
+    def label_to_xy(self, label: str):
+        i = self._label_index.get(label)
+        if i is None:
+            # slow path: lowercase / leading zeros ("a01")
+            letters = label.rstrip(string.digits).upper()
+            x = self._col_index[letters]
+            y = int(label[len(letters):]) - 1
+            return (x, y)
+        return (i % self.cols, i // self.cols)
+
+    def xy_to_label(self, x: int, y: int) -> str:
+        return self._labels[y * self.cols + x]
+
+    # --- writes ---
+
+    def set(self, x: int, y: int, value: int) -> bool:
+        """Set one cell; returns True if it actually flipped."""
+        return bool(self.apply_changes([((x, y), value)]))
+
+    def snapshot(self) -> Snapshot:
+        """Latest published state. Never blocks; the object is immutable."""
+        return self._snapshot
+
+    def apply_changes(self, updates, expected_version=None):
+        """
+        Write many cells at once: updates = iterable of ((x, y), value).
+        Cells already at their value are skipped; if anything flipped the version
+        bumps once for the whole batch and subscribers get one call.
+
+        expected_version: only write if the world is still at this version
+        (compare-and-set for writers that decided from a snapshot); None = always.
+        returns: list[Change] that actually happened, or None if expected_version was stale
+        """
+        updates = list(updates)  # evaluate a generator (label lookups) outside the lock
+        with self._write_lock:
+            if expected_version is not None and expected_version != self.version:
+                return None
+            return self._apply(updates)
+
+    def _apply(self, updates):
+        version = self.version + 1
+        cols, cells, zob = self.cols, self.cells, self._zobrist
+        h = self.grid_hash
+        changes = []
+        for (x, y), value in updates:
+            i = y * cols + x
+            value = 1 if value else 0
+            old = cells[i]
+            if old == value:
+                continue
+            cells[i] = value
+            h ^= zob[i]
+            changes.append(Change((x, y), old, value, version))
+
+        if not changes:
+            return changes
+
+        self.version = version
+        self.grid_hash = h
+        self._publish(changes)
+        return changes
+
+    def reset(self, value: int = 0):
+        with self._write_lock:
+            self.cells[:] = (b"\x01" if value else b"\x00") * len(self.cells)
+            self._reset_done()
+
+    # --- version / hash / subscribers ---
+
+    def subscribe(self, fn):
+        """
+        Call fn(changes) after every write batch, where changes is a list[Change],
+        or None after reset()/resize(). Runs on the writer's thread.
+        """
+        if fn not in self._subscribers:
+            self._subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        if fn in self._subscribers:
+            self._subscribers.remove(fn)
+
+    def _reset_done(self):
+        self.version += 1
+        h = self._zobrist_base
+        for i, v in enumerate(self.cells):
+            if v:
+                h ^= self._zobrist[i]
+        self.grid_hash = h
+        self._publish(None)
+
+    def _publish(self, changes):
+        # snapshot first, so a subscriber that grabs one already sees this batch
+        self._snapshot = Snapshot(bytes(self.cells), self.cols, self.rows, self.version, self.grid_hash)
+        for fn in list(self._subscribers):
+            fn(changes)
+
+
+# grid[y][x], y = row index (0..6), x = col index (0..3)
+# 0 = free, 1 = obstacle
+grid = OccupancyGrid(cols=4, rows=7)
+
+COLS = grid.col_labels    # ["A", "B", "C", "D"]
+ROWS = grid.row_numbers   # 1..7
+
+
+def __getattr__(name):
+    # version bumps on every change; grid_hash is a Zobrist hash of the blocked cells,
+    # so undoing a change (e.g. a tentative wall) gets the old hash back
+    if name in ("version", "grid_hash"):
+        return getattr(grid, name)
+    raise AttributeError(f"module 'world' has no attribute {name!r}")
+
+
+def snapshot() -> Snapshot:
+    """Consistent, immutable view of the grid for planners (lock-free)."""
+    return grid.snapshot()
+
+
+def resize(cols: int, rows: int):
+    """Change the arena size (clears the grid). COLS/ROWS/grid update in place."""
+    grid.resize(cols, rows)
+
+
+def subscribe(fn):
+    """Call fn(changes) after every write batch (list[Change], or None after a reset/resize)."""
+    grid.subscribe(fn)
+
+
+def unsubscribe(fn):
+    grid.unsubscribe(fn)
+
+
+class ChangeQueue:
+    """
+    World changes collected for a planner that catches up on its own schedule.
+    Subscribes on creation; drain() hands over what piled up since the last call.
+    Create it before taking the planner's first snapshot so no change falls in between.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._pending_all = False
+        subscribe(self._on_changes)
+
+    def close(self):
+        """Stop listening for world changes."""
+        unsubscribe(self._on_changes)
+
+    def _on_changes(self, changes):
+        with self._lock:
+            if changes is None:
+                self._pending_all = True
+            else:
+                self._pending.update(c.cell for c in changes)
+
+    def drain(self):
+        """(set of flipped (x, y) cells, reset) since the last drain; reset = a reset/resize happened."""
+        with self._lock:
+            changed, reset = self._pending, self._pending_all
+            self._pending = set()
+            self._pending_all = False
+        return changed, reset
+
+
 def label_to_xy(label: str):
     """
     "A1" -> (0, 0)
     "D12" -> (3, 11)
+    "AB3" -> (27, 2)
     """
-    col_letter = label[0].upper()
-    row_number = int(label[1:])
-    x = COLS.index(col_letter)
-    y = row_number - 1
-    return (x, y)
+    return grid.label_to_xy(label)
 
 
 def xy_to_label(x: int, y: int) -> str:
@@ -23,23 +285,30 @@ def xy_to_label(x: int, y: int) -> str:
     (0, 0) -> "A1"
     (3, 11) -> "D12"
     """
-    col = COLS[x]
-    row = y + 1
-    return f"{col}{row}"
+    return grid.xy_to_label(x, y)
 
 
 def set_obstacle(label: str):
-    x, y = label_to_xy(label)
-    grid[y][x] = 1
+    x, y = grid.label_to_xy(label)
+    grid.set(x, y, 1)
 
 
 def clear_obstacle(label: str):
-    x, y = label_to_xy(label)
-    grid[y][x] = 0
+    x, y = grid.label_to_xy(label)
+    grid.set(x, y, 0)
+
+
+def apply_changes(updates, expected_version=None):
+    """
+    Bulk write, one version bump: updates = {label: value} or iterable of (label, value).
+    expected_version: write only if world.version still equals it (see OccupancyGrid.apply_changes)
+    returns: list[Change] for the cells that actually flipped (None if expected_version was stale)
+    """
+    if isinstance(updates, dict):
+        updates = updates.items()
+    return grid.apply_changes(((grid.label_to_xy(lbl), v) for lbl, v in updates), expected_version)
 
 
 def reset_grid(value: int = 0):
     """Set entire grid to a value (0 = all free, 1 = all blocked)."""
-    for y in range(len(grid)):
-        for x in range(len(grid[0])):
-            grid[y][x] = value
\ No newline at end of file
+    grid.reset(value)